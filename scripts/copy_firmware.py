@@ -5,24 +5,347 @@ Called as a POST_BUILD command in CMake.
 """
 import os
 import sys
+import time
+import errno
+import select
 import shutil
 from datetime import datetime
 import subprocess
 
+# How long to wait for the .bin to appear after the .elf is linked
+BINARY_WAIT_TIMEOUT = 10.0  # seconds
+# Interval used only when no kernel file notification mechanism is available
+POLL_INTERVAL = 0.5  # seconds
+# How long the .bin's size and mtime must hold before it is treated as fully written
+FILE_STABLE_INTERVAL = 0.1  # seconds
+# Chunk size for the plain read/write copy fallback
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Repository root (the parent of this scripts directory)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_git_hash_cache = None
+
+# Name of the file (in the build directory) caching the hash between builds
+GIT_HASH_CACHE_FILE = ".git_hash_cache"
+
+def _get_git_hash_pygit2():
+    """Resolve the short HEAD hash in-process with libgit2. Raises ImportError if pygit2 is missing."""
+    import pygit2
+    repo_path = pygit2.discover_repository(REPO_ROOT)
+    if repo_path is None:
+        return None
+    repo = pygit2.Repository(repo_path)
+    if repo.head_is_unborn:
+        return None
+    return str(repo.head.target)[:7]
+
 def get_git_hash():
     """Get short git commit hash if available."""
+    global _git_hash_cache
+    if _git_hash_cache is not None:
+        return _git_hash_cache or None
+
+    git_hash = None
+    try:
+        git_hash = _get_git_hash_pygit2()
+    except ImportError:
+        # pygit2 not installed, fall back to the git command line
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--short=7', 'HEAD'],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=REPO_ROOT
+            )
+            git_hash = result.stdout.strip()
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            git_hash = None
+    except Exception:
+        # pygit2 raises its own error types for broken/missing repositories
+        git_hash = None
+
+    _git_hash_cache = git_hash or ""
+    return git_hash or None
+
+def _git_state_files():
+    """
+    Return the git files whose mtime changes when HEAD moves, or None if the
+    repository layout is not one we can check (e.g. a worktree .git file).
+    """
+    git_dir = os.path.join(REPO_ROOT, ".git")
+    if not os.path.isdir(git_dir):
+        return None
+    head_file = os.path.join(git_dir, "HEAD")
+    paths = [head_file, os.path.join(git_dir, "packed-refs")]
+    try:
+        with open(head_file, "r", encoding="utf-8") as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if head.startswith("ref: "):
+        paths.append(os.path.join(git_dir, *head[5:].split("/")))
+    return [path for path in paths if os.path.exists(path)]
+
+def get_cached_git_hash(cache_file):
+    """
+    Get short git commit hash, avoiding a repository lookup when possible.
+
+    Uses cache_file if it is newer than HEAD and the refs it points to, and
+    only then falls back to get_git_hash(), writing the result back to the
+    cache.
+    """
+    state_files = _git_state_files()
+    if state_files:
+        try:
+            cache_mtime = os.stat(cache_file).st_mtime_ns
+            if all(os.stat(path).st_mtime_ns < cache_mtime for path in state_files):
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    cached = f.read().strip()
+                if cached:
+                    return cached
+        except OSError:
+            pass
+
+    git_hash = get_git_hash()
+    if git_hash and state_files:
+        try:
+            with open(cache_file, "w", encoding="utf-8") as f:
+                f.write(git_hash)
+        except OSError as e:
+            print(f"Warning: Could not write git hash cache {cache_file}: {e}")
+    return git_hash
+
+def _file_state(path):
+    """Return (size, mtime) for path, or None if it does not exist yet."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+def _wait_inotify(path, deadline):
+    """Wait for path using Linux inotify. Returns None if inotify is unavailable."""
+    import ctypes
+    import ctypes.util
+    import struct
+
+    IN_MODIFY = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CLOSE_WRITE = 0x00000008
+    IN_NONBLOCK = os.O_NONBLOCK
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+    fd = inotify_init1(IN_NONBLOCK)
+    if fd < 0:
+        return None
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        name = os.fsencode(os.path.basename(path))
+        wd = inotify_add_watch(fd, os.fsencode(directory),
+                               IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            return None
+        # If the file appears after the watch is armed, only its writer closing
+        # it (or a rename into place) means it is complete. If it already
+        # existed, its close may have been missed, so also accept it once its
+        # size and mtime hold across an interval with no writes
+        last_state = _file_state(path)
+        existed = last_state is not None
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([fd], [], [], min(remaining, FILE_STABLE_INTERVAL))
+            if readable:
+                try:
+                    data = os.read(fd, 4096)
+                except BlockingIOError:
+                    data = b""
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(data):
+                    _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    event_name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+                    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and event_name == name:
+                        return True
+            state = _file_state(path)
+            if existed and not readable and state is not None and state == last_state:
+                return True
+            last_state = state
+    finally:
+        os.close(fd)
+
+def _wait_kqueue(path, deadline):
+    """Wait for path using BSD/macOS kqueue. Returns None if kqueue is unavailable."""
+    if not hasattr(select, "kqueue"):
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return None
+    kq = select.kqueue()
     try:
-        result = subprocess.run(
-            ['git', 'rev-parse', '--short=7', 'HEAD'],
-            capture_output=True,
-            text=True,
-            check=True,
-            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        )
-        return result.stdout.strip()
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        event = select.kevent(dir_fd,
+                              filter=select.KQ_FILTER_VNODE,
+                              flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                              fflags=select.KQ_NOTE_WRITE)
+        kq.control([event], 0, 0)
+        # The directory watch only reports the file appearing, so wait for its
+        # size and mtime to hold across a quiet interval before calling it done
+        last_state = _file_state(path)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            events = kq.control(None, 1, min(remaining, FILE_STABLE_INTERVAL))
+            state = _file_state(path)
+            if not events and state is not None and state == last_state:
+                return True
+            last_state = state
+    finally:
+        kq.close()
+        os.close(dir_fd)
+
+def _wait_windows(path, deadline):
+    """Wait for path using ReadDirectoryChangesW. Returns None if pywin32 is unavailable."""
+    try:
+        import win32con
+        import win32event
+        import win32file
+    except ImportError:
         return None
 
+    directory = os.path.dirname(os.path.abspath(path))
+    handle = win32file.FindFirstChangeNotification(
+        directory,
+        False,
+        win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE,
+    )
+    try:
+        # Change notifications do not say which file changed or whether its
+        # writer is done, so wait for a quiet interval with a stable size and mtime
+        last_state = _file_state(path)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            result = win32event.WaitForSingleObject(
+                handle, int(min(remaining, FILE_STABLE_INTERVAL) * 1000))
+            changed = result == win32event.WAIT_OBJECT_0
+            if changed:
+                win32file.FindNextChangeNotification(handle)
+            state = _file_state(path)
+            if not changed and state is not None and state == last_state:
+                return True
+            last_state = state
+    finally:
+        win32file.FindCloseChangeNotification(handle)
+
+def wait_for_file(path, timeout=BINARY_WAIT_TIMEOUT):
+    """
+    Block until path has been completely written or timeout expires.
+    Returns True if the file is ready to copy.
+
+    On Linux this returns as soon as inotify reports the writer closing (or
+    renaming in) the file. Elsewhere, and on Linux when the file already
+    existed before we started watching, the file counts as complete once its
+    size and mtime hold across a quiet interval; kqueue or Windows change
+    notifications restart that interval whenever the directory changes.
+    Plain polling is used only when none of them are available.
+    """
+    deadline = time.monotonic() + timeout
+    if os.path.isdir(os.path.dirname(os.path.abspath(path))):
+        if sys.platform.startswith("linux"):
+            waiters = (_wait_inotify,)
+        elif sys.platform == "win32":
+            waiters = (_wait_windows,)
+        else:
+            waiters = (_wait_kqueue,)
+        for waiter in waiters:
+            try:
+                result = waiter(path, deadline)
+            except OSError:
+                result = None
+            if result is not None:
+                return result
+
+    # Fallback: poll until the file exists and its size and mtime hold steady
+    last_state = _file_state(path)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(POLL_INTERVAL, remaining))
+        state = _file_state(path)
+        if state is not None and state == last_state:
+            return True
+        last_state = state
+
+def _fast_copy(src, dst):
+    """
+    Copy src to dst using in-kernel copies where possible.
+
+    Tries os.copy_file_range (which can reflink on CoW filesystems), then
+    os.sendfile, then a plain read/write loop. Metadata is copied afterwards
+    with shutil.copystat so the result matches shutil.copy2.
+    """
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            remaining = os.fstat(src_fd).st_size
+            unsupported = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+            copy_file_range = getattr(os, "copy_file_range", None)
+            while copy_file_range and remaining > 0:
+                try:
+                    copied = copy_file_range(src_fd, dst_fd, remaining)
+                except OSError as e:
+                    if e.errno not in unsupported:
+                        raise
+                    break
+                if copied == 0:
+                    break
+                remaining -= copied
+
+            sendfile = getattr(os, "sendfile", None)
+            while sendfile and remaining > 0 and sys.platform.startswith("linux"):
+                try:
+                    copied = sendfile(dst_fd, src_fd, None, remaining)
+                except OSError as e:
+                    if e.errno not in unsupported:
+                        raise
+                    break
+                if copied == 0:
+                    break
+                remaining -= copied
+
+            # Both fast paths advance the shared file offsets, so the fallback
+            # continues from wherever they stopped
+            while True:
+                chunk = os.read(src_fd, COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(dst_fd, view):]
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+
 def main():
     if len(sys.argv) < 3:
         print("Usage: copy_firmware.py <source_binary> <firmware_images_dir> [project_name]")
@@ -34,29 +357,20 @@ def main():
     
     # Wait for binary to be created (it's generated after linking)
     # ESP-IDF generates the binary file after the elf is linked, so we need to wait
-    import time
-    max_retries = 20  # Increased retries to allow more time for binary generation
-    retry_delay = 0.5  # seconds
-    
-    for attempt in range(max_retries):
-        if os.path.exists(source_binary):
-            break
-        if attempt < max_retries - 1:
-            time.sleep(retry_delay)
-        else:
-            print(f"ERROR: Source binary not found after {max_retries} attempts: {source_binary}")
-            print("This may happen if the binary generation step hasn't completed yet.")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Binary directory exists: {os.path.exists(os.path.dirname(source_binary))}")
-            # List files in binary directory to help debug
-            if os.path.exists(os.path.dirname(source_binary)):
-                print(f"Files in binary directory:")
-                try:
-                    for f in os.listdir(os.path.dirname(source_binary)):
-                        print(f"  {f}")
-                except Exception as e:
-                    print(f"  Error listing directory: {e}")
-            sys.exit(1)  # Fail the build so we know something is wrong
+    if not wait_for_file(source_binary):
+        print(f"ERROR: Source binary not found after {BINARY_WAIT_TIMEOUT:g} seconds: {source_binary}")
+        print("This may happen if the binary generation step hasn't completed yet.")
+        print(f"Current working directory: {os.getcwd()}")
+        print(f"Binary directory exists: {os.path.exists(os.path.dirname(source_binary))}")
+        # List files in binary directory to help debug
+        if os.path.exists(os.path.dirname(source_binary)):
+            print(f"Files in binary directory:")
+            try:
+                for f in os.listdir(os.path.dirname(source_binary)):
+                    print(f"  {f}")
+            except Exception as e:
+                print(f"  Error listing directory: {e}")
+        sys.exit(1)  # Fail the build so we know something is wrong
     
     # Create FirmwareImages directory if it doesn't exist
     os.makedirs(firmware_images_dir, exist_ok=True)
@@ -66,13 +380,15 @@ def main():
         if os.path.exists(firmware_images_dir):
             # Find all firmware files matching the project name pattern
             # Also check for old project name patterns to clean up legacy files
-            pattern_prefixes = [f"{project_name}_", "ESP32-P4-OpENerEIP_"]
-            for filename in os.listdir(firmware_images_dir):
-                # Delete files matching any of the project name patterns
-                if any(filename.startswith(prefix) and filename.endswith(".bin") for prefix in pattern_prefixes):
-                    old_file = os.path.join(firmware_images_dir, filename)
+            pattern_prefixes = (f"{project_name}_", "ESP32-P4-OpENerEIP_")
+            with os.scandir(firmware_images_dir) as entries:
+                for entry in entries:
+                    # Delete files matching any of the project name patterns
+                    filename = entry.name
+                    if not filename.endswith(".bin") or not filename.startswith(pattern_prefixes):
+                        continue
                     try:
-                        os.remove(old_file)
+                        os.unlink(entry.path)
                         print(f"Deleted old firmware: {filename}")
                     except Exception as e:
                         print(f"Warning: Could not delete old firmware {filename}: {e}")
@@ -83,7 +399,8 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # Try to get git commit hash
-    git_hash = get_git_hash()
+    git_hash = get_cached_git_hash(
+        os.path.join(os.path.dirname(os.path.abspath(source_binary)), GIT_HASH_CACHE_FILE))
     
     # Construct filename
     if git_hash:
@@ -93,15 +410,24 @@ def main():
     
     dest_binary = os.path.join(firmware_images_dir, dest_filename)
     
-    # Copy the binary
+    # Copy the binary to a temporary name and rename it into place, so an
+    # interrupted copy never leaves a truncated .bin in FirmwareImages
+    temp_binary = dest_binary + ".tmp"
     try:
-        shutil.copy2(source_binary, dest_binary)
+        _fast_copy(source_binary, temp_binary)
+        os.replace(temp_binary, dest_binary)
         print(f"Firmware copied successfully: {dest_filename}")
         print(f"  Source: {source_binary}")
         print(f"  Destination: {dest_binary}")
     except Exception as e:
         print(f"Error copying firmware: {e}")
         sys.exit(1)
+    finally:
+        if os.path.exists(temp_binary):
+            try:
+                os.unlink(temp_binary)
+            except OSError:
+                pass
 
 if __name__ == "__main__":
     main()
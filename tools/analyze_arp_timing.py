@@ -18,43 +18,75 @@ Or manually provide timestamps:
 import argparse
 import csv
 import sys
-from typing import List, Optional
+from typing import Optional, Sequence
 
+import numpy as np
 
-def calculate_intervals(timestamps: List[float]) -> List[float]:
+
+def calculate_intervals(timestamps: Sequence[float]) -> np.ndarray:
     """Calculate intervals between consecutive timestamps"""
     if len(timestamps) < 2:
-        return []
+        return np.empty(0, dtype=np.float64)
+    
+    return np.diff(np.asarray(timestamps, dtype=np.float64))
+
+
+def _read_timestamps_pandas(filename: str, mac_filter: Optional[str]) -> np.ndarray:
+    """Read timestamps with pandas' C CSV parser. Raises ImportError if pandas is missing."""
+    import pandas as pd
     
-    intervals = []
-    for i in range(1, len(timestamps)):
-        interval = timestamps[i] - timestamps[i-1]
-        intervals.append(interval)
+    columns = pd.read_csv(filename, nrows=0).columns
+    time_columns = [name for name in ('Time', 'Time (relative)') if name in columns]
+    usecols = time_columns + (['Source'] if mac_filter and 'Source' in columns else [])
+    if not time_columns or (mac_filter and 'Source' not in usecols):
+        return np.empty(0, dtype=np.float64)
     
-    return intervals
+    df = pd.read_csv(filename, usecols=usecols, dtype=str, keep_default_na=False)
+    
+    # Check MAC filter if provided
+    if mac_filter:
+        df = df[df['Source'].str.contains(mac_filter, case=False, regex=False)]
+    
+    # Extract timestamp (format varies by Wireshark version)
+    if len(time_columns) == 2:
+        times = df['Time'].where(df['Time'] != '', df['Time (relative)'])
+    else:
+        times = df[time_columns[0]]
+    timestamps = pd.to_numeric(times, errors='coerce').dropna()
+    return timestamps.to_numpy(dtype=np.float64)
 
 
-def analyze_csv(filename: str, mac_filter: Optional[str] = None) -> List[float]:
-    """Parse Wireshark CSV export and extract timestamps"""
+def _read_timestamps_csv(filename: str, mac_filter: Optional[str]) -> np.ndarray:
+    """Read timestamps row by row with the csv module"""
     timestamps = []
     
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Check MAC filter if provided
-                if mac_filter:
-                    source = row.get('Source', '')
-                    if mac_filter.lower() not in source.lower():
-                        continue
-                
-                # Extract timestamp (format varies by Wireshark version)
-                time_str = row.get('Time', '') or row.get('Time (relative)', '')
-                try:
-                    timestamp = float(time_str)
-                    timestamps.append(timestamp)
-                except ValueError:
+    with open(filename, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # Check MAC filter if provided
+            if mac_filter:
+                source = row.get('Source', '')
+                if mac_filter.lower() not in source.lower():
                     continue
+            
+            # Extract timestamp (format varies by Wireshark version)
+            time_str = row.get('Time', '') or row.get('Time (relative)', '')
+            try:
+                timestamp = float(time_str)
+                timestamps.append(timestamp)
+            except ValueError:
+                continue
+    
+    return np.asarray(timestamps, dtype=np.float64)
+
+
+def analyze_csv(filename: str, mac_filter: Optional[str] = None) -> np.ndarray:
+    """Parse Wireshark CSV export and extract timestamps"""
+    try:
+        try:
+            return _read_timestamps_pandas(filename, mac_filter)
+        except ImportError:
+            return _read_timestamps_csv(filename, mac_filter)
     
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found")
@@ -62,8 +94,6 @@ def analyze_csv(filename: str, mac_filter: Optional[str] = None) -> List[float]:
     except Exception as e:
         print(f"Error reading CSV: {e}")
         sys.exit(1)
-    
-    return timestamps
 
 
 def main():
@@ -95,7 +125,7 @@ def main():
         timestamps = sorted(args.timestamps)
     elif args.csv_file:
         timestamps = analyze_csv(args.csv_file, args.mac)
-        if not timestamps:
+        if len(timestamps) == 0:
             print("No matching packets found")
             sys.exit(1)
     else:
@@ -113,13 +143,15 @@ def main():
     print(f"Total duration: {timestamps[-1] - timestamps[0]:.3f}s")
     print(f"\nIntervals between packets:")
     
-    for i, interval in enumerate(intervals, 1):
-        print(f"  Interval {i}: {interval:.3f}s ({interval*1000:.0f}ms)")
+    print("\n".join(
+        f"  Interval {i}: {interval:.3f}s ({interval*1000:.0f}ms)"
+        for i, interval in enumerate(intervals.tolist(), 1)
+    ))
     
-    if intervals:
-        avg_interval = sum(intervals) / len(intervals)
-        min_interval = min(intervals)
-        max_interval = max(intervals)
+    if intervals.size:
+        avg_interval = float(intervals.mean())
+        min_interval = float(intervals.min())
+        max_interval = float(intervals.max())
         
         print(f"\nStatistics:")
         print(f"  Average interval: {avg_interval:.3f}s ({avg_interval*1000:.0f}ms)")
@@ -127,13 +159,13 @@ def main():
         print(f"  Maximum interval: {max_interval:.3f}s ({max_interval*1000:.0f}ms)")
         
         # Check if intervals are consistent (within 10% of average)
-        consistent = all(abs(i - avg_interval) / avg_interval < 0.1 for i in intervals)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            consistent = bool(np.all(np.abs(intervals - avg_interval) / avg_interval < 0.1))
         if consistent:
             print(f"\n[OK] Intervals are consistent - recommended value: {avg_interval*1000:.0f}ms")
         else:
             print(f"\n[WARN] Intervals vary significantly - may need to investigate")
 
-
 if __name__ == "__main__":
     main()
 
@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
 from scapy.all import get_if_list, get_if_addr, get_if_hwaddr
 
-interfaces = get_if_list()
-print("Available interfaces:")
-for iface in interfaces:
-    if iface == "\\Device\\NPF_Loopback":
-        continue
+def get_interface_details(iface):
+    """Look up MAC and IP for an interface, returning None for both on error."""
     try:
-        mac = get_if_hwaddr(iface)
-        ip = get_if_addr(iface)
+        return iface, get_if_hwaddr(iface), get_if_addr(iface)
+    except:
+        return iface, None, None
+
+interfaces = [iface for iface in get_if_list() if iface != "\\Device\\NPF_Loopback"]
+print("Available interfaces:")
+# The lookups are slow per-interface OS queries (notably on Windows), so run them concurrently
+with ThreadPoolExecutor(max_workers=8) as executor:
+    for iface, mac, ip in executor.map(get_interface_details, interfaces):
+        if mac is None:
+            print(f"  {iface} (error getting details)")
+            continue
         print(f"  {iface}")
         print(f"    MAC: {mac}")
         print(f"    IP:  {ip}")
-    except:
-        print(f"  {iface} (error getting details)")
-
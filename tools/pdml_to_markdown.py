@@ -6,37 +6,71 @@ Usage:
     python pdml_to_markdown.py input.pdml output.md
 """
 
-import xml.etree.ElementTree as ET
-import sys
-from datetime import datetime
+try:
+    # lxml's iterparse is implemented in C and considerably faster on large exports
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+import argparse
+import itertools
+import time
 
-def get_field_value(proto, field_name, default=''):
-    """Get a field value from a protocol."""
-    field = proto.find(f'.//field[@name="{field_name}"]')
-    return field.get('show', default) if field is not None else default
+# Minimum time between progress updates (console writes are slow, especially on Windows)
+PROGRESS_INTERVAL = 0.1  # seconds
 
-def get_field_value_nested(proto, field_names, default=''):
-    """Get a nested field value."""
-    current = proto
-    for name in field_names:
-        field = current.find(f'.//field[@name="{name}"]')
-        if field is None:
-            return default
-        current = field
-    return current.get('show', default)
+# Protocols whose fields are used to describe and summarize a packet
+SUMMARY_PROTOS = ('geninfo', 'frame', 'eth', 'arp', 'ip', 'tcp', 'udp', 'icmp')
 
-def describe_packet(packet):
-    """Generate a human-readable description of what the packet is doing."""
+def proto_fields(proto):
+    """
+    Map every field name in a protocol to its 'show' value in a single pass.
+    
+    Like find('.//field[@name=...]'), the first field with a given name wins.
+    """
+    fields = {}
+    if proto is None:
+        return fields
+    for field in proto.iter('field'):
+        name = field.get('name')
+        if name not in fields:
+            fields[name] = field.get('show', '')
+    return fields
+
+def packet_protos(packet):
+    """
+    Map every protocol name in a packet to its <proto> element in a single pass.
+    
+    Like find('.//proto[@name=...]'), the first (outermost) proto with a given name wins.
+    """
+    protos = {}
+    for proto in packet.iter('proto'):
+        name = proto.get('name')
+        if name not in protos:
+            protos[name] = proto
+    return protos
+
+def packet_fields(packet):
+    """
+    Extract everything needed to summarize a packet in one pass over its tree.
+    
+    Returns {proto_name: {field_name: show}} for the protocols in SUMMARY_PROTOS
+    that are present, so formatting never has to search the XML again.
+    """
+    protos = packet_protos(packet)
+    return {name: proto_fields(protos[name]) for name in SUMMARY_PROTOS if name in protos}
+
+def describe_packet(fields):
+    """Generate a human-readable description of what the packet is doing from packet_fields()."""
     descriptions = []
     
     # Check for ARP
-    arp_proto = packet.find('.//proto[@name="arp"]')
-    if arp_proto is not None:
-        opcode = get_field_value(arp_proto, 'arp.opcode', '')
-        is_probe = get_field_value(arp_proto, 'arp.isprobe', '')
-        src_ip = get_field_value(arp_proto, 'arp.src.proto_ipv4', '')
-        dst_ip = get_field_value(arp_proto, 'arp.dst.proto_ipv4', '')
-        src_mac = get_field_value(arp_proto, 'arp.src.hw_mac', '')
+    arp = fields.get('arp')
+    if arp is not None:
+        opcode = arp.get('arp.opcode', '')
+        is_probe = arp.get('arp.isprobe', '')
+        src_ip = arp.get('arp.src.proto_ipv4', '')
+        dst_ip = arp.get('arp.dst.proto_ipv4', '')
+        src_mac = arp.get('arp.src.hw_mac', '')
         
         if is_probe == 'True':
             descriptions.append(f"**ARP Probe** from `0.0.0.0` asking \"Who has {dst_ip}?\"")
@@ -48,18 +82,18 @@ def describe_packet(packet):
             descriptions.append(f"**ARP Reply** from `{src_ip}` responding to ARP request")
     
     # Check for IP
-    ip_proto = packet.find('.//proto[@name="ip"]')
-    if ip_proto is not None:
-        src_ip = get_field_value(ip_proto, 'ip.src', '')
-        dst_ip = get_field_value(ip_proto, 'ip.dst', '')
-        proto = get_field_value(ip_proto, 'ip.proto', '')
+    ip = fields.get('ip')
+    if ip is not None:
+        src_ip = ip.get('ip.src', '')
+        dst_ip = ip.get('ip.dst', '')
+        proto = ip.get('ip.proto', '')
         
         # Check for TCP
-        tcp_proto = packet.find('.//proto[@name="tcp"]')
-        if tcp_proto is not None:
-            src_port = get_field_value(tcp_proto, 'tcp.srcport', '')
-            dst_port = get_field_value(tcp_proto, 'tcp.dstport', '')
-            flags = get_field_value(tcp_proto, 'tcp.flags', '')
+        tcp = fields.get('tcp')
+        if tcp is not None:
+            src_port = tcp.get('tcp.srcport', '')
+            dst_port = tcp.get('tcp.dstport', '')
+            flags = tcp.get('tcp.flags', '')
             
             if dst_port == '44818':
                 descriptions.append(f"**EtherNet/IP** TCP connection to `{dst_ip}:{dst_port}`")
@@ -71,10 +105,10 @@ def describe_packet(packet):
                 descriptions.append(f"**TCP** `{src_ip}:{src_port}` → `{dst_ip}:{dst_port}`")
         
         # Check for UDP
-        udp_proto = packet.find('.//proto[@name="udp"]')
-        if udp_proto is not None:
-            src_port = get_field_value(udp_proto, 'udp.srcport', '')
-            dst_port = get_field_value(udp_proto, 'udp.dstport', '')
+        udp = fields.get('udp')
+        if udp is not None:
+            src_port = udp.get('udp.srcport', '')
+            dst_port = udp.get('udp.dstport', '')
             
             if dst_port == '2222':
                 descriptions.append(f"**EtherNet/IP** UDP to `{dst_ip}:{dst_port}`")
@@ -84,163 +118,177 @@ def describe_packet(packet):
                 descriptions.append(f"**UDP** `{src_ip}:{src_port}` → `{dst_ip}:{dst_port}`")
         
         # Check for ICMP
-        icmp_proto = packet.find('.//proto[@name="icmp"]')
-        if icmp_proto is not None:
+        icmp = fields.get('icmp')
+        if icmp is not None:
             descriptions.append(f"**ICMP** `{src_ip}` → `{dst_ip}`")
     
     # Check for Ethernet
-    eth_proto = packet.find('.//proto[@name="eth"]')
-    if eth_proto is not None:
-        dst_mac = get_field_value(eth_proto, 'eth.dst', '')
-        src_mac = get_field_value(eth_proto, 'eth.src', '')
+    eth = fields.get('eth')
+    if eth is not None:
+        dst_mac = eth.get('eth.dst', '')
+        src_mac = eth.get('eth.src', '')
         
         if dst_mac == 'ff:ff:ff:ff:ff:ff':
             descriptions.append(f"**Broadcast** frame from `{src_mac}`")
     
     if not descriptions:
-        protocols_field = packet.find('.//field[@name="frame.protocols"]')
-        protocols = protocols_field.get('show', '') if protocols_field is not None else ''
+        protocols = fields.get('frame', {}).get('frame.protocols', '')
         descriptions.append(f"**Unknown** packet - Protocols: `{protocols}`")
     
     return ' | '.join(descriptions)
 
-def format_packet_concise(packet, packet_num):
-    """Format a single packet as concise markdown."""
+def format_packet_concise(fields, packet_num):
+    """Format a single packet, given its packet_fields(), as concise markdown."""
     # Extract general info
-    geninfo = packet.find('.//proto[@name="geninfo"]')
-    frame_info = packet.find('.//proto[@name="frame"]')
-    
-    packet_num_field = geninfo.find('.//field[@name="num"]') if geninfo is not None else None
-    timestamp_field = geninfo.find('.//field[@name="timestamp"]') if geninfo is not None else None
-    len_field = geninfo.find('.//field[@name="len"]') if geninfo is not None else None
-    time_delta_field = frame_info.find('.//field[@name="frame.time_delta_displayed"]') if frame_info is not None else None
-    if time_delta_field is None:
-        time_delta_field = frame_info.find('.//field[@name="frame.time_delta"]') if frame_info is not None else None
+    geninfo_fields = fields.get('geninfo', {})
+    frame_fields = fields.get('frame', {})
     
-    packet_number = packet_num_field.get('show', str(packet_num)) if packet_num_field is not None else str(packet_num)
-    timestamp = timestamp_field.get('show', '') if timestamp_field is not None else ''
-    length = len_field.get('show', '') if len_field is not None else ''
-    time_delta = time_delta_field.get('show', '') if time_delta_field is not None else ''
+    packet_number = geninfo_fields.get('num') or str(packet_num)
+    timestamp = geninfo_fields.get('timestamp', '')
+    length = geninfo_fields.get('len', '')
+    if 'frame.time_delta_displayed' in frame_fields:
+        time_delta = frame_fields['frame.time_delta_displayed']
+    else:
+        time_delta = frame_fields.get('frame.time_delta', '')
     
     # Get protocols
-    protocols_field = frame_info.find('.//field[@name="frame.protocols"]') if frame_info is not None else None
-    protocols = protocols_field.get('show', '') if protocols_field is not None else ''
+    protocols = frame_fields.get('frame.protocols', '')
     
     # Generate description
-    description = describe_packet(packet)
+    description = describe_packet(fields)
     
     # Extract key fields for summary - prioritize IP addresses
-    key_fields = []
-    seen_fields = set()  # Track what we've already added to avoid duplicates
+    # Keyed by slot so a later layer can overwrite an earlier value in place
+    # (insertion order is preserved, so the output order is unchanged)
+    key_fields = {}
     
     # ARP fields - get IPs from ARP first
-    arp_proto = packet.find('.//proto[@name="arp"]')
-    arp_src_ip = ''
-    arp_dst_ip = ''
+    arp = fields.get('arp')
     arp_src_mac = ''
-    if arp_proto is not None:
-        arp_src_ip = get_field_value(arp_proto, 'arp.src.proto_ipv4', '')
-        arp_dst_ip = get_field_value(arp_proto, 'arp.dst.proto_ipv4', '')
-        arp_src_mac = get_field_value(arp_proto, 'arp.src.hw_mac', '')
+    if arp is not None:
+        arp_src_ip = arp.get('arp.src.proto_ipv4', '')
+        arp_dst_ip = arp.get('arp.dst.proto_ipv4', '')
+        arp_src_mac = arp.get('arp.src.hw_mac', '')
         if arp_src_ip:
-            key_fields.append(f"Source IP: `{arp_src_ip}`")
-            seen_fields.add('src_ip')
+            key_fields['src_ip'] = ("Source IP", arp_src_ip)
         if arp_dst_ip:
-            key_fields.append(f"Target IP: `{arp_dst_ip}`")
-            seen_fields.add('dst_ip')
+            key_fields['dst_ip'] = ("Target IP", arp_dst_ip)
         if arp_src_mac:
-            key_fields.append(f"Source MAC: `{arp_src_mac}`")
-            seen_fields.add('arp_src_mac')
+            key_fields['src_mac'] = ("Source MAC", arp_src_mac)
     
-    # IP fields - use IP layer if ARP didn't have IPs
-    ip_proto = packet.find('.//proto[@name="ip"]')
-    if ip_proto is not None:
-        ip_src = get_field_value(ip_proto, 'ip.src', '')
-        ip_dst = get_field_value(ip_proto, 'ip.dst', '')
-        # Always add IPs from IP layer if available (they're more accurate for IP packets)
-        if ip_src and 'src_ip' not in seen_fields:
-            key_fields.append(f"Source IP: `{ip_src}`")
-            seen_fields.add('src_ip')
-        elif ip_src and ip_src != arp_src_ip:
-            # Replace ARP IP with IP layer IP (more accurate)
-            key_fields = [f.replace(f"Source IP: `{arp_src_ip}`", f"Source IP: `{ip_src}`") for f in key_fields]
-        if ip_dst and 'dst_ip' not in seen_fields:
-            key_fields.append(f"Destination IP: `{ip_dst}`")
-            seen_fields.add('dst_ip')
-        elif ip_dst and ip_dst != arp_dst_ip:
-            # Replace ARP IP with IP layer IP (more accurate)
-            key_fields = [f.replace(f"Target IP: `{arp_dst_ip}`", f"Destination IP: `{ip_dst}`") for f in key_fields]
+    # IP fields - the IP layer takes precedence over ARP (more accurate for IP packets)
+    ip = fields.get('ip')
+    if ip is not None:
+        ip_src = ip.get('ip.src', '')
+        ip_dst = ip.get('ip.dst', '')
+        if ip_src:
+            key_fields['src_ip'] = ("Source IP", ip_src)
+        if ip_dst and key_fields.get('dst_ip', ('', ''))[1] != ip_dst:
+            key_fields['dst_ip'] = ("Destination IP", ip_dst)
     
     # TCP fields
-    tcp_proto = packet.find('.//proto[@name="tcp"]')
-    if tcp_proto is not None:
-        src_port = get_field_value(tcp_proto, 'tcp.srcport', '')
-        dst_port = get_field_value(tcp_proto, 'tcp.dstport', '')
-        flags = get_field_value(tcp_proto, 'tcp.flags', '')
+    tcp = fields.get('tcp')
+    if tcp is not None:
+        src_port = tcp.get('tcp.srcport', '')
+        dst_port = tcp.get('tcp.dstport', '')
+        flags = tcp.get('tcp.flags', '')
         if src_port:
-            key_fields.append(f"Source Port: `{src_port}`")
+            key_fields['tcp_src_port'] = ("Source Port", src_port)
         if dst_port:
-            key_fields.append(f"Destination Port: `{dst_port}`")
+            key_fields['tcp_dst_port'] = ("Destination Port", dst_port)
         if flags:
-            key_fields.append(f"TCP Flags: `{flags}`")
+            key_fields['tcp_flags'] = ("TCP Flags", flags)
     
     # UDP fields
-    udp_proto = packet.find('.//proto[@name="udp"]')
-    if udp_proto is not None:
-        src_port = get_field_value(udp_proto, 'udp.srcport', '')
-        dst_port = get_field_value(udp_proto, 'udp.dstport', '')
+    udp = fields.get('udp')
+    if udp is not None:
+        src_port = udp.get('udp.srcport', '')
+        dst_port = udp.get('udp.dstport', '')
         if src_port:
-            key_fields.append(f"Source Port: `{src_port}`")
+            key_fields['udp_src_port'] = ("Source Port", src_port)
         if dst_port:
-            key_fields.append(f"Destination Port: `{dst_port}`")
+            key_fields['udp_dst_port'] = ("Destination Port", dst_port)
     
-    # Ethernet fields - only add if not already added from ARP
-    eth_proto = packet.find('.//proto[@name="eth"]')
-    if eth_proto is not None:
-        eth_src_mac = get_field_value(eth_proto, 'eth.src', '')
-        eth_dst_mac = get_field_value(eth_proto, 'eth.dst', '')
-        if eth_src_mac and 'arp_src_mac' not in seen_fields and eth_src_mac != arp_src_mac:
-            key_fields.append(f"Source MAC: `{eth_src_mac}`")
+    # Ethernet fields - only add source MAC if not already added from ARP
+    eth = fields.get('eth')
+    if eth is not None:
+        eth_src_mac = eth.get('eth.src', '')
+        eth_dst_mac = eth.get('eth.dst', '')
+        if eth_src_mac and 'src_mac' not in key_fields:
+            key_fields['src_mac'] = ("Source MAC", eth_src_mac)
         if eth_dst_mac:
-            key_fields.append(f"Destination MAC: `{eth_dst_mac}`")
+            key_fields['dst_mac'] = ("Destination MAC", eth_dst_mac)
     
-    # Build markdown
-    result = [f"## Packet #{packet_number}"]
+    # Build markdown - fixed lines are concatenated directly, only the
+    # variable-length key field list is joined
     if timestamp:
         # Extract just the time part for brevity
         time_part = timestamp.split(' ')[-1] if ' ' in timestamp else timestamp
-        result.append(f"**Time:** {time_part}")
-    if time_delta:
-        result.append(f"**Delta:** {time_delta} seconds")
-    if length:
-        result.append(f"**Size:** {length} bytes")
-    if protocols:
-        result.append(f"**Protocols:** `{protocols}`")
-    
-    result.append('')
-    result.append(f"**Description:** {description}")
+        time_line = f"**Time:** {time_part}\n"
+    else:
+        time_line = ''
+    delta_line = f"**Delta:** {time_delta} seconds\n" if time_delta else ''
+    size_line = f"**Size:** {length} bytes\n" if length else ''
+    protocols_line = f"**Protocols:** `{protocols}`\n" if protocols else ''
     
     if key_fields:
-        result.append('')
-        result.append("**Key Fields:**")
-        for field in key_fields:
-            result.append(f"- {field}")
+        key_section = "\n\n**Key Fields:**\n" + '\n'.join(
+            f"- {label}: `{value}`" for label, value in key_fields.values())
+    else:
+        key_section = ''
     
-    return '\n'.join(result)
+    return (f"## Packet #{packet_number}\n"
+            f"{time_line}{delta_line}{size_line}{protocols_line}"
+            f"\n**Description:** {description}"
+            f"{key_section}")
 
-def convert_pdml_to_markdown(input_file, output_file):
-    """Convert PDML file to Markdown."""
-    print(f"Parsing {input_file}...")
-    tree = ET.parse(input_file)
-    root = tree.getroot()
+def iter_packets(input_file, metadata):
+    """
+    Yield each <packet> element of a PDML file as soon as its subtree is complete.
+    
+    The export is streamed so that only one <packet> subtree is held in memory
+    at a time; a packet is cleared once the consumer asks for the next one.
+    The root element's attributes are copied into metadata when parsing starts.
+    """
+    context = ET.iterparse(input_file, events=('start', 'end'))
+    root = None
+    
+    for event, elem in context:
+        if root is None:
+            # First event is the start of the <pdml> root element
+            root = elem
+            metadata.update(root.attrib)
+            continue
+        
+        if event != 'end' or elem.tag != 'packet':
+            continue
+        
+        yield elem
+        
+        # Release the processed packet (and the root's reference to it)
+        elem.clear()
+        root.clear()
+
+def iter_markdown(input_file, stats):
+    """
+    Yield the Markdown document for a PDML file piece by piece.
+    
+    The number of converted packets is recorded in stats['packets'].
+    """
+    metadata = {}
+    packets = iter_packets(input_file, metadata)
+    # Start parsing so the root's metadata is available for the header
+    first_packet = next(packets, None)
+    stats['packets'] = 0
+    last_progress = 0.0
     
     # Extract metadata
-    creator = root.get('creator', 'unknown')
-    time_str = root.get('time', '')
-    capture_file = root.get('capture_file', '')
+    creator = metadata.get('creator', 'unknown')
+    time_str = metadata.get('time', '')
+    capture_file = metadata.get('capture_file', '')
     
-    # Build markdown document
-    md_lines = [
+    # Markdown document header
+    yield '\n'.join([
         "# Wireshark Packet Capture Export",
         "",
         f"**Capture File:** `{capture_file}`",
@@ -249,33 +297,39 @@ def convert_pdml_to_markdown(input_file, output_file):
         "",
         "---",
         ""
-    ]
-    
-    # Process each packet
-    packets = root.findall('packet')
-    print(f"Found {len(packets)} packets")
+    ])
     
-    for i, packet in enumerate(packets, 1):
-        print(f"Processing packet {i}/{len(packets)}...", end='\r')
-        packet_md = format_packet_concise(packet, i)
-        md_lines.append(packet_md)
-        md_lines.append('')
-        md_lines.append('---')
-        md_lines.append('')
+    if first_packet is None:
+        return
     
-    print(f"\nWriting {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(md_lines))
+    for packet_num, packet in enumerate(itertools.chain([first_packet], packets), 1):
+        packet_md = format_packet_concise(packet_fields(packet), packet_num)
+        stats['packets'] += 1
+        now = time.monotonic()
+        if now - last_progress >= PROGRESS_INTERVAL:
+            print(f"Processing packet {stats['packets']}...", end='\r')
+            last_progress = now
+        yield f"\n{packet_md}\n\n---\n"
     
-    print(f"Done! Converted {len(packets)} packets to {output_file}")
+    print(f"Processing packet {stats['packets']}...", end='\r')
 
-if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python pdml_to_markdown.py input.pdml output.md")
-        sys.exit(1)
+def convert_pdml_to_markdown(input_file, output_file):
+    """Convert PDML file to Markdown."""
+    print(f"Parsing {input_file}...")
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    stats = {}
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        f.writelines(iter_markdown(input_file, stats))
+    print(f"\nWrote {output_file}")
     
-    convert_pdml_to_markdown(input_file, output_file)
+    print(f"Done! Converted {stats['packets']} packets to {output_file}")
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Convert a Wireshark PDML export to concise Markdown"
+    )
+    parser.add_argument('input_file', help='PDML file exported from Wireshark')
+    parser.add_argument('output_file', help='Markdown file to write')
+    args = parser.parse_args()
+    
+    convert_pdml_to_markdown(args.input_file, args.output_file)
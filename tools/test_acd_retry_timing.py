@@ -14,22 +14,34 @@ Usage:
     python test_acd_retry_timing.py --ip 172.16.82.100 --esp32-mac 30:ed:a0:e3:34:c1 --interface eth0
     python test_acd_retry_timing.py --ip 172.16.82.100 --esp32-mac 30:ed:a0:e3:34:c1 --interface eth0 --retry-delay 10000 --max-attempts 5
     python test_acd_retry_timing.py --ip 172.16.82.100 --esp32-mac 30:ed:a0:e3:34:c1 --interface eth0 --test-ongoing
+    python test_acd_retry_timing.py --ip 172.16.82.100 --esp32-mac 30:ed:a0:e3:34:c1 --interface eth0 --backend pcap
 
 Requirements:
-    pip install scapy
+    pip install scapy numpy
+    pip install pypcap  (optional, for --backend pcap)
 
 Author: Adam G. Sweeney <agsweeney@gmail.com>
 License: MIT
 """
 
 import argparse
+import ctypes
+import itertools
+import re
+import socket
+import struct
 import time
 import sys
 import os
-from datetime import datetime, timedelta
-from collections import deque
-from scapy.all import ARP, Ether, sendp, sniff, get_if_list
-import random
+import queue
+import threading
+import numpy as np
+from scapy.all import ARP, Ether, AsyncSniffer, conf, get_if_list
+
+try:
+    import pcap  # pypcap: libpcap capture with a kernel BPF filter, for --backend pcap
+except ImportError:
+    pcap = None
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -37,23 +49,249 @@ if sys.platform == 'win32':
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
+# Ethernet header is 14 bytes; the ARP header for Ethernet/IPv4 follows it
+ETH_HEADER_LEN = 14
+# htype, ptype, hlen, plen, op, sender MAC, sender IP, target MAC, target IP
+ARP_HEADER = struct.Struct("!HHBBH6s4s6s4s")
+# Sender MAC within the frame, checked before anything else is unpacked
+ARP_SHA = slice(ETH_HEADER_LEN + 8, ETH_HEADER_LEN + 14)
+
+# Read timeout for the pcap backend, so the test duration is checked regularly
+PCAP_TIMEOUT_MS = 1
+
+# MAC address format accepted by --esp32-mac, checked after lowercasing
+MAC_RE = re.compile(r'^([0-9a-f]{2}[:-]){5}([0-9a-f]{2})$')
+
+# Sender IP of an ARP probe (0.0.0.0), as it appears in the frame
+ZERO_IP = b"\x00\x00\x00\x00"
+
+# Timestamps are integer nanoseconds from time.perf_counter_ns()
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+
+# Initial number of probes the timestamp arrays hold; they double when full
+PROBE_CAPACITY = 8192
+
+# Frames the capture ring holds for the worker thread; new frames are
+# dropped (and counted) while it is full
+CAPTURE_RING_SLOTS = 4096
+# Each slot is a capture timestamp (ns) and frame length, then the frame.
+# Only the first 42 bytes (Ethernet + ARP header) are ever parsed, so
+# longer frames (padding, trailers) are truncated to fit
+RING_SLOT_SIZE = 64
+RING_SLOT_HEADER = struct.Struct("<qH")
+RING_SLOT_PAYLOAD = RING_SLOT_SIZE - RING_SLOT_HEADER.size
+# How long the worker sleeps when the capture ring is empty
+WORKER_IDLE_S = 0.001
+# Longest the log thread waits for a line before checking again
+LOG_FLUSH_S = 0.1
+# How often run() checks whether the worker or conflict thread has failed
+CAPTURE_CHECK_S = 0.1
+
+# Log lines printed for every probe, as %-templates: one C-level format
+# call per line instead of evaluating an f-string field by field
+PROBE_LOG = "[%s] Probe #%d in attempt #%d (interval: %.0fms)"
+WAITING_PROBE_LOG = "[%s] Probe phase probe detected (not responding - waiting for IP acquisition)"
+
+# Ongoing phase schedule: first conflict 2s after acquisition, second 5s
+# later (within the device's 10s DEFEND_INTERVAL)
+FIRST_CONFLICT_DELAY_NS = 2 * NS_PER_S
+SECOND_CONFLICT_DELAY_NS = 5 * NS_PER_S
+# sleep_until() wakes this long before a deadline and finishes in 1ms steps
+SLEEP_SLACK_NS = 2 * NS_PER_MS
+
+
+# What classify() makes of an ARP packet from the ESP32; also the index
+# into RetryTimingTest.dispatch
+ARP_IGNORE = 0
+ARP_DEFENSIVE = 1  # probe/announcement from its own IP (ongoing phase)
+ARP_PROBE = 2      # probe for the target IP from 0.0.0.0 (probe phase)
+
+
+def _arp_kind(op, psrc_is_zero, psrc_is_target, pdst_is_target):
+    """The classification rules; only evaluated to build the CLASSIFY table"""
+    if psrc_is_target:  # ARP request (probe) or reply (announcement)
+        return ARP_DEFENSIVE
+    if (op == 1 and  # ARP request
+        psrc_is_zero and  # Source IP is 0.0.0.0 (probe)
+        pdst_is_target):  # Target is our IP
+        return ARP_PROBE
+    return ARP_IGNORE
+
+
+# (op, sender IP is 0.0.0.0, sender IP is ours, target IP is ours) -> kind,
+# for every ARP request/reply, so a packet is classified by one lookup
+CLASSIFY = {
+    key: _arp_kind(*key)
+    for key in itertools.product((1, 2), (False, True), (False, True), (False, True))
+}
+
+
+def classify(op, psrc, pdst, target_ip):
+    """
+    Classify an ARP request/reply sent by the ESP32 from its opcode and
+    sender/target IPs (all IPs as 4-byte packed addresses).
+    
+    This is a pure function of the packet; whether a probe also means a
+    retreat depends on the test state and is decided by handle_probe().
+    """
+    return CLASSIFY[op, psrc == ZERO_IP, psrc == target_ip, pdst == target_ip]
+
+
+# (second, "HH:MM:SS") for the last second now_hms() formatted; swapped as
+# a whole so the worker and conflict threads never see a mismatched pair
+_last_hms = (None, "")
+
+
+def now_hms():
+    """Local wall-clock time as HH:MM:SS for log lines, formatted at most once per second"""
+    global _last_hms
+    now = int(time.time())
+    second, text = _last_hms
+    if now != second:
+        text = time.strftime('%H:%M:%S', time.localtime(now))
+        _last_hms = (now, text)
+    return text
+
+
+def sleep_until(deadline_ns, stop):
+    """
+    Sleep until time.perf_counter_ns() reaches deadline_ns, or until the
+    stop event is set. Returns False if it was stopped.
+    
+    A single time.sleep() can overshoot by a scheduler tick (15.6ms on
+    Windows by default), so sleep most of the way and then finish in short
+    steps against the monotonic clock.
+    """
+    while True:
+        remaining = deadline_ns - time.perf_counter_ns()
+        if remaining <= 0:
+            return True
+        if stop.wait(max(remaining - SLEEP_SLACK_NS, min(remaining, NS_PER_MS)) / NS_PER_S):
+            return False
+
+
+def open_raw_socket(interface):
+    """Open a raw Ethernet socket bound to interface, or return None if unavailable (e.g. Windows)"""
+    if not hasattr(socket, "AF_PACKET"):
+        return None
+    try:
+        # Protocol 0 makes it send-only: the kernel queues no received frames on it
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        sock.bind((interface, 0))
+        return sock
+    except OSError:
+        return None
+
+
+class FrameRing:
+    """
+    Single-producer/single-consumer ring of captured frames in one
+    preallocated buffer.
+    
+    The capture thread only ever writes tail and the worker only ever writes
+    head, so neither side takes a lock, and no per-frame objects are queued.
+    When the worker falls behind, new frames are dropped and counted rather
+    than blocking capture (like a full kernel socket buffer).
+    """
+    
+    def __init__(self, slots=CAPTURE_RING_SLOTS):
+        self.slots = slots
+        self.buf = bytearray(slots * RING_SLOT_SIZE)
+        self.head = 0  # Frames consumed (worker)
+        self.tail = 0  # Frames produced (capture thread)
+        self.dropped = 0
+    
+    def put(self, timestamp, frame):
+        """Store a frame with its capture timestamp, or count it as dropped if full"""
+        tail = self.tail
+        if tail - self.head >= self.slots:
+            self.dropped += 1
+            return
+        offset = (tail % self.slots) * RING_SLOT_SIZE
+        frame = frame[:RING_SLOT_PAYLOAD]
+        RING_SLOT_HEADER.pack_into(self.buf, offset, timestamp, len(frame))
+        start = offset + RING_SLOT_HEADER.size
+        self.buf[start:start + len(frame)] = frame
+        # Publish the slot only once it is fully written
+        self.tail = tail + 1
+    
+    def get(self):
+        """Return the oldest (timestamp, frame), or None if the ring is empty"""
+        head = self.head
+        if head == self.tail:
+            return None
+        offset = (head % self.slots) * RING_SLOT_SIZE
+        timestamp, length = RING_SLOT_HEADER.unpack_from(self.buf, offset)
+        start = offset + RING_SLOT_HEADER.size
+        # Copy out before releasing the slot back to the producer
+        frame = bytes(self.buf[start:start + length])
+        self.head = head + 1
+        return timestamp, frame
+
 
 class RetryTimingTest:
-    def __init__(self, interface, target_ip, esp32_mac, expected_retry_delay_ms=10000, max_attempts=5, test_duration=120, test_ongoing=False):
+    def __init__(self, interface, target_ip, esp32_mac, expected_retry_delay_ms=10000, max_attempts=5, test_duration=120, test_ongoing=False,
+                 backend="scapy", quiet=False):
         self.interface = interface
         self.target_ip = target_ip
+        # Compared against the raw sender/target IPs of every captured frame
+        self.target_ip_bytes = socket.inet_aton(target_ip)
         self.esp32_mac = esp32_mac.lower()
+        # Compared against the raw sender MAC of every captured frame
+        self.esp32_mac_bytes = bytes.fromhex(self.esp32_mac.replace(":", ""))
+        # Kernel BPF filter shared by both capture backends: only ARP requests
+        # and replies sent by the ESP32 reach Python. Probes and defensive
+        # ARPs both come from this MAC, so a single capture covers both phases
+        self.capture_filter = f"arp and ether src {self.esp32_mac} and (arp[7] == 1 or arp[7] == 2)"
         self.expected_retry_delay_ms = expected_retry_delay_ms
         self.max_attempts = max_attempts
         self.test_duration = test_duration
         self.test_ongoing = test_ongoing
+        self.backend = backend
+        self.quiet = quiet  # Skip the per-probe lines so printing never holds up capture
         
-        # Generate a fake MAC for the conflicting device
-        self.conflict_mac = f"02:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}"
+        # Generate a fake MAC for the conflicting device (locally administered
+        # unicast, 02:xx:xx:xx:xx:xx, from a single urandom read)
+        self.conflict_mac = "02:" + ":".join(f"{b:02x}" for b in os.urandom(5))
         
-        # Tracking
-        self.probe_times = []  # List of (timestamp, attempt_number)
-        self.retry_intervals = []  # List of intervals between retries (ms)
+        # Every address in the conflict packets is fixed for the whole test,
+        # so build them once and keep the wire bytes for tx_sock
+        # ARP reply claiming the IP, sent to the ESP32 in response to its probes
+        self.conflict_reply = Ether(dst=self.esp32_mac, src=self.conflict_mac) / ARP(
+            op=2,  # ARP reply
+            psrc=self.target_ip,  # Source IP (the IP we're claiming)
+            pdst=self.target_ip,  # Target IP
+            hwsrc=self.conflict_mac,  # Source MAC (conflicting device)
+            hwdst=self.esp32_mac  # Target MAC (ESP32)
+        )
+        # ARP announcement (op=2) claiming the IP during the ongoing phase
+        self.ongoing_conflict = Ether(dst="ff:ff:ff:ff:ff:ff", src=self.conflict_mac) / ARP(
+            op=2,  # ARP reply/announcement
+            psrc=self.target_ip,  # Source IP (the IP we're claiming)
+            pdst=self.target_ip,  # Target IP (same)
+            hwsrc=self.conflict_mac,  # Source MAC (conflicting device)
+            hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast
+        )
+        self.conflict_reply_bytes = bytes(self.conflict_reply)
+        # Logged with every conflict reply; nothing in it changes during the test
+        self.conflict_reply_log = f"  -> Sending conflict reply (MAC: {self.conflict_mac})"
+        self.ongoing_conflict_bytes = bytes(self.ongoing_conflict)
+        self.tx_sock = None  # Raw socket (or Scapy L2 socket off Linux) opened by run()
+        # Handler for each classify() result, indexed by kind (ARP_IGNORE never dispatches)
+        self.dispatch = (None, self.handle_defensive, self.handle_probe)
+        # Frames handed from the capture callback to the worker thread
+        self.capture_ring = FrameRing()
+        # Lines for the log thread to print; None tells it to stop
+        self.log_queue = queue.SimpleQueue()
+        
+        # Tracking (all timestamps are time.perf_counter_ns() values: monotonic,
+        # high resolution on every platform, and immune to NTP clock steps)
+        # Probe timestamps and attempt numbers as parallel arrays; only the
+        # first probe_count entries are valid
+        self.probe_times = np.empty(PROBE_CAPACITY, dtype=np.int64)
+        self.probe_attempts = np.empty(PROBE_CAPACITY, dtype=np.int32)
+        self.probe_count = 0
         self.conflicts_triggered = 0
         self.start_time = None
         self.last_probe_time = None
@@ -64,156 +302,248 @@ class RetryTimingTest:
         self.ip_acquired_time = None
         self.ongoing_conflicts_sent = 0
         self.first_conflict_time = None
+        self.second_conflict_time = None
         self.defensive_arps_detected = 0
         self.retreat_detected = False
+        self.retreat_time = None
+        # Ongoing phase conflict sender; run() stops and joins it before closing tx_sock
+        self.conflict_thread = None
+        self.stopping = threading.Event()
+        # First exception raised on the worker or conflict thread; ends the capture early
+        self.thread_error = None
+    
+    def record_probe(self, timestamp, attempt):
+        """Append a probe to the timestamp arrays, doubling them when full"""
+        n = self.probe_count
+        if n == len(self.probe_times):
+            self.probe_times = np.concatenate((self.probe_times, np.empty_like(self.probe_times)))
+            self.probe_attempts = np.concatenate((self.probe_attempts, np.empty_like(self.probe_attempts)))
+        self.probe_times[n] = timestamp
+        self.probe_attempts[n] = attempt
+        self.probe_count = n + 1
+    
+    @property
+    def retry_intervals(self):
+        """Intervals between consecutive probes in milliseconds"""
+        return np.diff(self.probe_times[:self.probe_count]) / NS_PER_MS
         
-    def send_conflict_reply(self, probe_mac):
-        """Send ARP reply claiming the IP to trigger conflict"""
-        arp = ARP(
-            op=2,  # ARP reply
-            psrc=self.target_ip,  # Source IP (the IP we're claiming)
-            pdst=self.target_ip,  # Target IP
-            hwsrc=self.conflict_mac,  # Source MAC (conflicting device)
-            hwdst=probe_mac  # Target MAC (ESP32)
-        )
-        
-        packet = Ether(dst=probe_mac, src=self.conflict_mac) / arp
-        sendp(packet, iface=self.interface, verbose=False)
+    def send_conflict_reply(self):
+        """Send ARP reply to the ESP32 claiming the IP to trigger conflict"""
+        self.tx_sock.send(self.conflict_reply_bytes)
         self.conflicts_triggered += 1
     
     def send_ongoing_conflict(self):
         """Send ARP announcement claiming the IP during ongoing phase"""
-        # Send ARP announcement (op=2) claiming the IP
-        arp = ARP(
-            op=2,  # ARP reply/announcement
-            psrc=self.target_ip,  # Source IP (the IP we're claiming)
-            pdst=self.target_ip,  # Target IP (same)
-            hwsrc=self.conflict_mac,  # Source MAC (conflicting device)
-            hwdst="ff:ff:ff:ff:ff:ff"  # Broadcast
-        )
-        
-        packet = Ether(dst="ff:ff:ff:ff:ff:ff", src=self.conflict_mac) / arp
-        sendp(packet, iface=self.interface, verbose=False)
+        self.tx_sock.send(self.ongoing_conflict_bytes)
         self.conflicts_triggered += 1
         self.ongoing_conflicts_sent += 1
         
-    def handle_arp_packet(self, packet):
-        """Handle incoming ARP packets"""
-        if not packet.haslayer(ARP):
+    def fail(self, error):
+        """Record an exception from a background thread and stop the test"""
+        if self.thread_error is None:
+            self.thread_error = error
+        self.stopping.set()
+    
+    def log(self, line):
+        """Queue a line for the log thread instead of printing it on the calling thread"""
+        self.log_queue.put(line)
+    
+    def write_log(self):
+        """
+        Log thread: print queued lines until None is queued.
+        
+        Whatever has queued up by the time the first line arrives is written
+        and flushed as one chunk, so a burst of probes costs one console write
+        (and, on Windows, one pass through the UTF-8 stdout wrapper).
+        """
+        log_queue = self.log_queue
+        out = sys.stdout
+        while True:
+            try:
+                lines = [log_queue.get(timeout=LOG_FLUSH_S)]
+            except queue.Empty:
+                continue
+            try:
+                while True:
+                    lines.append(log_queue.get_nowait())
+            except queue.Empty:
+                pass
+            done = None in lines
+            if done:
+                lines = lines[:lines.index(None)]
+            if lines:
+                out.write("\n".join(lines) + "\n")
+                out.flush()
+            if done:
+                return
+    
+    def enqueue_frame(self, frame):
+        """
+        Capture callback: timestamp the frame and queue it for the worker.
+        
+        Parsing, printing and sending replies all happen on the worker thread,
+        so a slow console or send never holds up the capture loop.
+        """
+        self.capture_ring.put(time.perf_counter_ns(), frame)
+    
+    def process_queue(self, capture_done):
+        """
+        Worker thread: handle queued frames until capture_done is set and the ring is empty.
+        
+        An exception from a handler or send is recorded with fail(), which
+        stops the capture so run() reports the error instead of statistics.
+        """
+        ring = self.capture_ring
+        try:
+            while True:
+                record = ring.get()
+                if record is None:
+                    if capture_done.is_set():
+                        return
+                    time.sleep(WORKER_IDLE_S)
+                    continue
+                self.handle_arp_frame(record[1], record[0])
+        except Exception as e:
+            self.fail(e)
+    
+    def handle_arp_frame(self, frame, current_time):
+        """
+        Handle a raw Ethernet frame from either capture backend.
+        
+        The handful of ARP fields needed sit at fixed offsets, so they are
+        unpacked with struct instead of having Scapy dissect the packet.
+        Frames not sent by the ESP32, or that aren't ARP requests/replies, are
+        dropped first, and the IPs are compared as packed bytes.
+        """
+        if (len(frame) < ETH_HEADER_LEN + ARP_HEADER.size or frame[12:14] != b"\x08\x06"
+                or frame[ARP_SHA] != self.esp32_mac_bytes):
             return
+        _, _, _, _, op, _, psrc, _, pdst = ARP_HEADER.unpack_from(frame, ETH_HEADER_LEN)
+        if op != 1 and op != 2:
+            return
+        kind = classify(op, psrc, pdst, self.target_ip_bytes)
+        if kind == ARP_IGNORE:
+            return
+        return self.dispatch[kind](current_time)
+    
+    def handle_defensive(self, current_time):
+        """Handle a defensive ARP probe/announcement from the device's own IP (ongoing phase)"""
+        if not self.ip_acquired:
+            # Device has acquired IP and is sending defensive ARPs
+            self.ip_acquired = True
+            self.ip_acquired_time = current_time
+            elapsed = (current_time - self.start_time) / NS_PER_S if self.start_time is not None else 0
+            self.log(f"\n[{now_hms()}] *** IP ACQUIRED - Device entered ongoing phase ***")
+            self.log(f"  Time to acquisition: {elapsed:.1f}s")
             
-        arp = packet[ARP]
-        packet_mac = str(arp.hwsrc).lower()
-        psrc_str = str(arp.psrc)
-        pdst_str = str(arp.pdst)
-        current_time = time.time()
-        
-        # Check for defensive ARP announcements/probes from device's own IP (ongoing phase)
-        if (packet_mac == self.esp32_mac and 
-            psrc_str == self.target_ip and
-            (arp.op == 1 or arp.op == 2)):  # ARP request (probe) or reply (announcement)
-            
-            if not self.ip_acquired:
-                # Device has acquired IP and is sending defensive ARPs
-                self.ip_acquired = True
-                self.ip_acquired_time = current_time
-                elapsed = current_time - self.start_time if self.start_time else 0
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] *** IP ACQUIRED - Device entered ongoing phase ***")
-                print(f"  Time to acquisition: {elapsed:.1f}s")
+            if self.test_ongoing:
+                # Use a separate thread or async approach to send conflicts without blocking
+                def send_conflicts():
+                    try:
+                        send_conflict_pair()
+                    except Exception as e:
+                        self.fail(e)
                 
-                if self.test_ongoing:
-                    # Use a separate thread or async approach to send conflicts without blocking
-                    import threading
-                    def send_conflicts():
-                        print(f"  Starting ongoing phase defense test...")
-                        print(f"  Waiting 2 seconds before sending first conflict...")
-                        time.sleep(2)
-                        print(f"  [{datetime.now().strftime('%H:%M:%S')}] Sending FIRST conflict (should be defended)")
-                        self.first_conflict_time = time.time()
-                        self.send_ongoing_conflict()
-                        print(f"  [{datetime.now().strftime('%H:%M:%S')}] Waiting 5 seconds before sending SECOND conflict...")
-                        # Schedule second conflict in 5 seconds (within DEFEND_INTERVAL of 10s)
-                        time.sleep(5)
-                        print(f"  [{datetime.now().strftime('%H:%M:%S')}] Sending SECOND conflict within DEFEND_INTERVAL (should trigger retreat)")
-                        self.send_ongoing_conflict()
-                        print(f"  [{datetime.now().strftime('%H:%M:%S')}] Monitoring for retreat (device should remove IP and start retry)...")
-                    
-                    # Start conflict sending in background thread
-                    conflict_thread = threading.Thread(target=send_conflicts, daemon=True)
-                    conflict_thread.start()
-            
-            self.defensive_arps_detected += 1
-            return
+                def send_conflict_pair():
+                    # Deadlines are taken from the monotonic clock, with the second one
+                    # anchored to when the first conflict actually went out, so sleep
+                    # drift can't stretch the gap past DEFEND_INTERVAL
+                    self.log(f"  Starting ongoing phase defense test...")
+                    self.log(f"  Waiting 2 seconds before sending first conflict...")
+                    if not sleep_until(current_time + FIRST_CONFLICT_DELAY_NS, self.stopping):
+                        return
+                    self.log(f"  [{now_hms()}] Sending FIRST conflict (should be defended)")
+                    self.first_conflict_time = time.perf_counter_ns()
+                    self.send_ongoing_conflict()
+                    self.log(f"  [{now_hms()}] Waiting 5 seconds before sending SECOND conflict...")
+                    # Schedule second conflict in 5 seconds (within DEFEND_INTERVAL of 10s)
+                    if not sleep_until(self.first_conflict_time + SECOND_CONFLICT_DELAY_NS, self.stopping):
+                        return
+                    self.log(f"  [{now_hms()}] Sending SECOND conflict within DEFEND_INTERVAL (should trigger retreat)")
+                    self.second_conflict_time = time.perf_counter_ns()
+                    self.send_ongoing_conflict()
+                    self.log(f"  [{now_hms()}] Monitoring for retreat (device should remove IP and start retry)...")
+                
+                # Start conflict sending in background thread
+                self.conflict_thread = threading.Thread(target=send_conflicts, daemon=True)
+                self.conflict_thread.start()
         
-        # Check if this is an ARP probe from our ESP32 device (probe phase)
-        if (arp.op == 1 and  # ARP request
-            psrc_str == "0.0.0.0" and  # Source IP is 0.0.0.0 (probe)
-            pdst_str == self.target_ip and  # Target is our IP
-            packet_mac == self.esp32_mac):  # From ESP32 MAC
-            
-            if self.start_time is None:
-                self.start_time = current_time
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Test started")
-            
-            # If we were in ongoing phase and now see probes from 0.0.0.0, device retreated
-            if self.ip_acquired and not self.retreat_detected:
-                self.retreat_detected = True
-                retreat_time = current_time - self.first_conflict_time if self.first_conflict_time else 0
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] *** RETREAT DETECTED - Device removed IP and started retry ***")
-                print(f"  Time from first conflict: {retreat_time:.1f}s")
-                print(f"  Device is now retrying (sending probes from 0.0.0.0)")
-                self.ip_acquired = False  # Reset for next cycle
-                # After retreat, we can respond to probes again (retry phase)
-                # Fall through to probe handling below
-            
-            # If testing ongoing phase, don't respond to probe phase probes
-            # We want device to acquire IP first, then test ongoing defense
-            if self.test_ongoing and not self.ip_acquired and not self.retreat_detected:
-                # Just log the probe but don't respond - let device acquire IP
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] Probe phase probe detected (not responding - waiting for IP acquisition)")
-                return False
-            
-            # Calculate time since start
-            elapsed = current_time - self.start_time
+        self.defensive_arps_detected += 1
+    
+    def handle_retreat(self, current_time, ts_str):
+        """Record the device giving up its IP, seen as a probe from 0.0.0.0 after acquisition"""
+        self.retreat_detected = True
+        self.retreat_time = current_time
+        since_conflict = ((current_time - self.first_conflict_time) / NS_PER_S
+                          if self.first_conflict_time is not None else 0)
+        self.log(f"\n[{ts_str}] *** RETREAT DETECTED - Device removed IP and started retry ***")
+        self.log(f"  Time from first conflict: {since_conflict:.1f}s")
+        self.log(f"  Device is now retrying (sending probes from 0.0.0.0)")
+        self.ip_acquired = False  # Reset for next cycle
+    
+    def handle_probe(self, current_time):
+        """Handle an ARP probe for the target IP from 0.0.0.0 (probe phase or retry)"""
+        # Format the wall-clock time once for every line this probe prints
+        ts_str = now_hms()
+        
+        if self.start_time is None:
+            self.start_time = current_time
+            self.log(f"\n[{ts_str}] Test started")
+        
+        # If we were in ongoing phase and now see probes from 0.0.0.0, device retreated
+        if self.ip_acquired and not self.retreat_detected:
+            self.handle_retreat(current_time, ts_str)
+            # After retreat, we can respond to probes again (retry phase)
+        
+        # If testing ongoing phase, don't respond to probe phase probes
+        # We want device to acquire IP first, then test ongoing defense
+        if self.test_ongoing and not self.ip_acquired and not self.retreat_detected:
+            # Just log the probe but don't respond - let device acquire IP
+            if not self.quiet:
+                self.log(WAITING_PROBE_LOG % ts_str)
+            return False
+        
+        # Calculate time since start
+        elapsed = (current_time - self.start_time) / NS_PER_S
+        
+        # Check if this is a new retry attempt
+        if self.last_probe_time is not None:
+            interval_ms = (current_time - self.last_probe_time) / NS_PER_MS
             
-            # Check if this is a new retry attempt
-            if self.last_probe_time is not None:
-                interval_ms = (current_time - self.last_probe_time) * 1000
-                self.retry_intervals.append(interval_ms)
+            # Determine if this is a new attempt or part of probe sequence
+            # If interval is > 5 seconds, it's likely a new retry attempt
+            if interval_ms > 5000:
+                self.current_attempt += 1
+                self.log(f"\n[{ts_str}] Retry Attempt #{self.current_attempt} detected")
+                self.log(f"  Time since last probe: {interval_ms:.0f}ms (expected: ~{self.expected_retry_delay_ms}ms)")
                 
-                # Determine if this is a new attempt or part of probe sequence
-                # If interval is > 5 seconds, it's likely a new retry attempt
-                if interval_ms > 5000:
-                    self.current_attempt += 1
-                    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Retry Attempt #{self.current_attempt} detected")
-                    print(f"  Time since last probe: {interval_ms:.0f}ms (expected: ~{self.expected_retry_delay_ms}ms)")
-                    
-                    # Check if timing matches expected retry delay (allow ±20% tolerance)
-                    tolerance = self.expected_retry_delay_ms * 0.2
-                    if abs(interval_ms - self.expected_retry_delay_ms) <= tolerance:
-                        print(f"  [OK] Timing matches expected retry delay")
-                    else:
-                        print(f"  [FAIL] Timing does NOT match expected retry delay (difference: {abs(interval_ms - self.expected_retry_delay_ms):.0f}ms)")
+                # Check if timing matches expected retry delay (allow ±20% tolerance)
+                tolerance = self.expected_retry_delay_ms * 0.2
+                if abs(interval_ms - self.expected_retry_delay_ms) <= tolerance:
+                    self.log(f"  [OK] Timing matches expected retry delay")
                 else:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Probe #{len(self.probe_times) + 1} in attempt #{self.current_attempt + 1} (interval: {interval_ms:.0f}ms)")
-            else:
-                self.current_attempt = 1
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Initial Attempt #{self.current_attempt} detected")
-            
-            # Record probe time
-            self.probe_times.append((current_time, self.current_attempt))
-            self.last_probe_time = current_time
-            
-            # Send conflict reply (only if not in ongoing test mode waiting for IP acquisition)
-            if not (self.test_ongoing and not self.ip_acquired and not self.retreat_detected):
-                print(f"  -> Sending conflict reply (MAC: {self.conflict_mac})")
-                self.send_conflict_reply(self.esp32_mac)
-            
-            # Check if we've exceeded max attempts
-            if self.max_attempts > 0 and self.current_attempt >= self.max_attempts:
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Maximum attempts ({self.max_attempts}) reached")
-                return True  # Signal to stop
-            
+                    self.log(f"  [FAIL] Timing does NOT match expected retry delay (difference: {abs(interval_ms - self.expected_retry_delay_ms):.0f}ms)")
+            elif not self.quiet:
+                self.log(PROBE_LOG % (ts_str, self.probe_count + 1, self.current_attempt + 1, interval_ms))
+        else:
+            self.current_attempt = 1
+            self.log(f"\n[{ts_str}] Initial Attempt #{self.current_attempt} detected")
+        
+        # Record probe time
+        self.record_probe(current_time, self.current_attempt)
+        self.last_probe_time = current_time
+        
+        # Send conflict reply (only if not in ongoing test mode waiting for IP acquisition)
+        if not (self.test_ongoing and not self.ip_acquired and not self.retreat_detected):
+            if not self.quiet:
+                self.log(self.conflict_reply_log)
+            self.send_conflict_reply()
+        
+        # Check if we've exceeded max attempts
+        if self.max_attempts > 0 and self.current_attempt >= self.max_attempts:
+            self.log(f"\n[{ts_str}] Maximum attempts ({self.max_attempts}) reached")
+            return True  # Signal to stop
+        
         return False
     
     def run(self):
@@ -228,6 +558,7 @@ class RetryTimingTest:
         print(f"Max Attempts: {self.max_attempts if self.max_attempts > 0 else 'Unlimited'}")
         print(f"Test Duration: {self.test_duration}s")
         print(f"Test Ongoing Phase: {'Yes' if self.test_ongoing else 'No (probe phase only)'}")
+        print(f"Capture Backend: {self.backend}")
         print("=" * 70)
         if self.test_ongoing:
             print("\nTesting ongoing phase defense:")
@@ -245,20 +576,54 @@ class RetryTimingTest:
         
         stop_reason = None
         
+        # Raise the Windows timer resolution to 1ms for the conflict schedule
+        # (before Python 3.11 time.sleep() there resolves to 15.6ms)
+        winmm = ctypes.windll.winmm if sys.platform == 'win32' else None
+        if winmm is not None:
+            winmm.timeBeginPeriod(1)
+        
+        # Captured frames are queued and handled on a worker thread, which in
+        # turn queues its output for the log thread
+        log_thread = threading.Thread(target=self.write_log, daemon=True)
+        log_thread.start()
+        capture_done = threading.Event()
+        worker = threading.Thread(target=self.process_queue, args=(capture_done,), daemon=True)
+        worker.start()
+        sniffer = None
+        
         try:
+            # On Linux send the prebuilt conflict packets with one send() on a raw
+            # socket; elsewhere open one Scapy L2 socket for the whole test rather
+            # than letting sendp() open and close one per packet
+            self.tx_sock = open_raw_socket(self.interface)
+            if self.tx_sock is None:
+                self.tx_sock = conf.L2socket(iface=self.interface)
+            
             # Sniff for ARP packets
-            start_sniff_time = time.time()
-            sniff(
-                iface=self.interface,
-                filter="arp",
-                prn=lambda p: self.handle_arp_packet(p),
-                timeout=self.test_duration,
-                stop_filter=lambda p: False,
-                store=False
-            )
+            start_sniff_time = time.perf_counter_ns()
+            if self.backend == "pcap":
+                self.capture_pcap()
+            else:
+                sniffer = AsyncSniffer(
+                    iface=self.interface,
+                    filter=self.capture_filter,
+                    # Scapy keeps the captured bytes, so queue those rather than its dissection
+                    prn=lambda p: self.enqueue_frame(p.original),
+                    store=False
+                )
+                sniffer.start()
+                # Stopped in finally once the test duration runs out, the sniffer
+                # thread exits, or a background thread calls fail()
+                deadline = start_sniff_time + self.test_duration * NS_PER_S
+                while sniffer.thread.is_alive():
+                    remaining = (deadline - time.perf_counter_ns()) / NS_PER_S
+                    if remaining <= 0 or self.stopping.wait(min(remaining, CAPTURE_CHECK_S)):
+                        break
+                # Re-raises the error if the sniffer thread itself failed
+                sniffer.join(timeout=0)
             
             # Check if we stopped due to timeout
-            if time.time() - start_sniff_time >= self.test_duration:
+            if time.perf_counter_ns() - start_sniff_time >= self.test_duration * NS_PER_S:
                 stop_reason = "Test duration expired"
             else:
                 stop_reason = "User interrupt"
@@ -270,17 +635,65 @@ class RetryTimingTest:
             import traceback
             traceback.print_exc()
             return
+        finally:
+            # A sniffer whose thread failed (e.g. the filter didn't compile) still
+            # reports running, and stop() would re-raise the error reported above,
+            # skipping the rest of this cleanup
+            if sniffer is not None and sniffer.running and sniffer.exception is None:
+                try:
+                    sniffer.stop()
+                except Exception as e:
+                    print(f"\nError stopping capture: {e}")
+            # Let the worker finish the frames already captured, then print
+            # everything it logged before the report
+            capture_done.set()
+            worker.join()
+            # The conflict thread sends on tx_sock, so stop it before the socket closes
+            self.stopping.set()
+            if self.conflict_thread is not None:
+                self.conflict_thread.join()
+            self.log_queue.put(None)
+            log_thread.join()
+            if winmm is not None:
+                winmm.timeEndPeriod(1)
+            if self.tx_sock is not None:
+                self.tx_sock.close()
+                self.tx_sock = None
+        
+        if self.thread_error is not None:
+            # The capture was cut short, so a report would only describe part of the test
+            print(f"\nError during test: {self.thread_error}")
+            import traceback
+            traceback.print_exception(type(self.thread_error), self.thread_error, self.thread_error.__traceback__)
+            return
         
         # Generate report
         self.generate_report(stop_reason)
     
+    def capture_pcap(self):
+        """
+        Capture with libpcap instead of Scapy's sniff().
+        
+        As with sniff(), the BPF filter only passes ARP frames sent by the
+        ESP32, so other traffic is dropped in the kernel, and frames are parsed
+        with struct rather than dissected by Scapy. Immediate mode delivers each
+        frame as soon as it arrives instead of buffering it, which would skew
+        the timing.
+        """
+        capture = pcap.pcap(name=self.interface, promisc=True, immediate=True, timeout_ms=PCAP_TIMEOUT_MS)
+        capture.setfilter(self.capture_filter)
+        deadline = time.monotonic() + self.test_duration
+        while time.monotonic() < deadline and not self.stopping.is_set():
+            for _, frame in capture.readpkts():
+                self.enqueue_frame(frame)
+    
     def generate_report(self, stop_reason):
         """Generate test report"""
         print("\n" + "=" * 70)
         print("TEST REPORT")
         print("=" * 70)
         
-        if len(self.probe_times) == 0:
+        if self.probe_count == 0:
             print("\nWARNING: No ARP probes detected from ESP32 device!")
             print("\nPossible issues:")
             print("  - ESP32 MAC address incorrect")
@@ -290,41 +703,52 @@ class RetryTimingTest:
             print("  - Network interface incorrect")
             return
         
-        total_time = time.time() - self.start_time if self.start_time else 0
+        total_time = (time.perf_counter_ns() - self.start_time) / NS_PER_S if self.start_time is not None else 0
         
         print(f"\nTest Duration: {total_time:.1f}s")
         print(f"Stop Reason: {stop_reason}")
-        print(f"\nTotal Probes Detected: {len(self.probe_times)}")
+        print(f"\nTotal Probes Detected: {self.probe_count}")
         print(f"Conflicts Triggered: {self.conflicts_triggered}")
+        if self.capture_ring.dropped:
+            print(f"Frames Dropped (capture ring full): {self.capture_ring.dropped}")
         print(f"Retry Attempts Detected: {self.current_attempt}")
         
         if self.test_ongoing:
             print(f"\nOngoing Phase Test Results:")
-            print(f"  IP Acquired: {'Yes' if self.ip_acquired_time else 'No'}")
-            if self.ip_acquired_time:
-                acquisition_time = self.ip_acquired_time - self.start_time if self.start_time else 0
+            print(f"  IP Acquired: {'Yes' if self.ip_acquired_time is not None else 'No'}")
+            if self.ip_acquired_time is not None:
+                acquisition_time = ((self.ip_acquired_time - self.start_time) / NS_PER_S
+                                    if self.start_time is not None else 0)
                 print(f"  Time to Acquisition: {acquisition_time:.1f}s")
             print(f"  Defensive ARPs Detected: {self.defensive_arps_detected}")
             print(f"  Ongoing Conflicts Sent: {self.ongoing_conflicts_sent}")
+            if self.first_conflict_time is not None and self.second_conflict_time is not None:
+                conflict_gap = (self.second_conflict_time - self.first_conflict_time) / NS_PER_S
+                print(f"  Gap Between Conflicts: {conflict_gap:.3f}s")
             print(f"  Retreat Detected: {'Yes' if self.retreat_detected else 'No'}")
-            if self.first_conflict_time and self.retreat_detected:
-                retreat_time = self.ip_acquired_time - self.first_conflict_time if self.ip_acquired_time else 0
+            if self.first_conflict_time is not None and self.retreat_detected:
+                # Measured to the first probe after the retreat, on the same monotonic clock
+                retreat_time = (self.retreat_time - self.first_conflict_time) / NS_PER_S
                 print(f"  Time from First Conflict to Retreat: {retreat_time:.1f}s")
                 if retreat_time > 0 and retreat_time < 15:
                     print(f"  [OK] Retreat occurred within expected timeframe (< 15s)")
                 else:
                     print(f"  [WARN] Retreat timing may be unexpected")
         
-        if len(self.retry_intervals) > 0:
+        retry_intervals = self.retry_intervals
+        if len(retry_intervals) > 0:
+            # Which intervals are within ±20% of the expected delay, in one vectorized pass
+            tolerance = self.expected_retry_delay_ms * 0.2
+            in_tolerance = np.abs(retry_intervals - self.expected_retry_delay_ms) <= tolerance
+            
             print(f"\nRetry Intervals (ms):")
-            for i, interval in enumerate(self.retry_intervals, 1):
-                tolerance = self.expected_retry_delay_ms * 0.2
-                match = "[OK]" if abs(interval - self.expected_retry_delay_ms) <= tolerance else "[FAIL]"
+            for i, (interval, ok) in enumerate(zip(retry_intervals.tolist(), in_tolerance.tolist()), 1):
+                match = "[OK]" if ok else "[FAIL]"
                 print(f"  Interval {i}: {interval:.0f}ms {match}")
             
-            avg_interval = sum(self.retry_intervals) / len(self.retry_intervals)
-            min_interval = min(self.retry_intervals)
-            max_interval = max(self.retry_intervals)
+            avg_interval = retry_intervals.mean()
+            min_interval = retry_intervals.min()
+            max_interval = retry_intervals.max()
             
             print(f"\nRetry Interval Statistics:")
             print(f"  Average: {avg_interval:.0f}ms")
@@ -333,11 +757,10 @@ class RetryTimingTest:
             print(f"  Expected: {self.expected_retry_delay_ms}ms")
             
             # Check if retry logic is working
-            tolerance = self.expected_retry_delay_ms * 0.2
-            matches = sum(1 for iv in self.retry_intervals if abs(iv - self.expected_retry_delay_ms) <= tolerance)
-            match_percentage = (matches / len(self.retry_intervals)) * 100
+            matches = int(np.count_nonzero(in_tolerance))
+            match_percentage = (matches / len(retry_intervals)) * 100
             
-            print(f"\nRetry Timing Accuracy: {matches}/{len(self.retry_intervals)} intervals match ({match_percentage:.1f}%)")
+            print(f"\nRetry Timing Accuracy: {matches}/{len(retry_intervals)} intervals match ({match_percentage:.1f}%)")
             
             if match_percentage >= 80:
                 print("  [OK] Retry logic appears to be working correctly")
@@ -353,22 +776,24 @@ class RetryTimingTest:
                 print("  (Test may have ended before max attempts reached)")
         
         # Probe timing analysis
-        if len(self.probe_times) > 3:
+        if self.probe_count > 3:
             print(f"\nProbe Sequence Analysis:")
-            # Group probes by attempt
-            attempts = {}
-            for probe_time, attempt_num in self.probe_times:
-                if attempt_num not in attempts:
-                    attempts[attempt_num] = []
-                attempts[attempt_num].append(probe_time)
+            # Group probes by attempt: a stable sort keeps each attempt's probes in
+            # time order, and np.unique gives where each attempt's run starts
+            order = np.argsort(self.probe_attempts[:self.probe_count], kind="stable")
+            attempt_nums = self.probe_attempts[:self.probe_count][order]
+            probe_times = self.probe_times[:self.probe_count][order]
+            attempt_ids, first, counts = np.unique(attempt_nums, return_index=True, return_counts=True)
+            last = first + counts - 1
             
-            for attempt_num in sorted(attempts.keys()):
-                probe_times = attempts[attempt_num]
-                if len(probe_times) >= 2:
-                    intervals = [(probe_times[i+1] - probe_times[i]) * 1000 
-                                for i in range(len(probe_times) - 1)]
-                    avg_probe_interval = sum(intervals) / len(intervals)
-                    print(f"  Attempt #{attempt_num}: {len(probe_times)} probes, avg interval: {avg_probe_interval:.0f}ms")
+            # The mean of consecutive intervals within a run is (last - first) / (count - 1)
+            multi = counts >= 2
+            avg_probe_intervals = ((probe_times[last[multi]] - probe_times[first[multi]])
+                                   / (counts[multi] - 1) / NS_PER_MS)
+            for attempt_num, count, avg_probe_interval in zip(attempt_ids[multi].tolist(),
+                                                              counts[multi].tolist(),
+                                                              avg_probe_intervals.tolist()):
+                print(f"  Attempt #{attempt_num}: {count} probes, avg interval: {avg_probe_interval:.0f}ms")
         
         print("\n" + "=" * 70)
 
@@ -438,26 +863,49 @@ Examples:
         help="Test ongoing phase defense (first conflict defended, second triggers retreat)"
     )
     
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Don't print a line for every probe, only attempts, phase changes and the report"
+    )
+    
+    parser.add_argument(
+        "--backend",
+        choices=["scapy", "pcap"],
+        default="scapy",
+        help="Packet capture backend; pcap uses pypcap with a kernel BPF filter (default: scapy)"
+    )
+    
     args = parser.parse_args()
     
-    # Validate interface
-    interfaces = get_if_list()
-    if args.interface not in interfaces:
-        print(f"Warning: Interface '{args.interface}' not found in list:")
-        for iface in interfaces:
-            print(f"  - {iface}")
-        print("\nTrying anyway...")
+    if args.backend == "pcap" and pcap is None:
+        print("Error: --backend pcap requires pypcap (pip install pypcap)")
+        sys.exit(1)
     
     # Normalize MAC address
     args.esp32_mac = args.esp32_mac.lower().replace('-', ':')
     
-    # Validate MAC format
-    import re
-    if not re.match(r'^([0-9a-f]{2}[:-]){5}([0-9a-f]{2})$', args.esp32_mac):
+    # Validate MAC format before the (slower) interface lookup
+    if not MAC_RE.match(args.esp32_mac):
         print(f"Error: Invalid MAC address format: {args.esp32_mac}")
         print("Expected format: XX:XX:XX:XX:XX:XX")
         sys.exit(1)
     
+    # Validate IP address (compared as packed bytes against captured frames)
+    try:
+        socket.inet_aton(args.ip)
+    except OSError:
+        print(f"Error: Invalid IP address: {args.ip}")
+        sys.exit(1)
+    
+    # Validate interface
+    interfaces = get_if_list()
+    if args.interface not in interfaces:
+        print(f"Warning: Interface '{args.interface}' not found in list:")
+        for iface in interfaces:
+            print(f"  - {iface}")
+        print("\nTrying anyway...")
+    
     # Run test
     test = RetryTimingTest(
         interface=args.interface,
@@ -466,7 +914,9 @@ Examples:
         expected_retry_delay_ms=args.retry_delay,
         max_attempts=args.max_attempts,
         test_duration=args.duration,
-        test_ongoing=args.test_ongoing
+        test_ongoing=args.test_ongoing,
+        backend=args.backend,
+        quiet=args.quiet
     )
     
     test.run()